@@ -0,0 +1,104 @@
+"""Shared request handling for the Vercel functions in api/.
+
+Everything that can be computed once per container lives at module level so
+warm invocations only pay for the route itself: header blocks and status
+lines are prebuilt bytes, the signing key is read once, and PyJWT is only
+imported by the functions that actually issue tokens.
+"""
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+import datetime
+import json
+
+SIGNING_KEY = 'demo-secret-key'
+TOKEN_ALGORITHM = 'HS256'
+
+JSON_HEADERS = (
+    b'Content-type: application/json\r\n'
+    b'Access-Control-Allow-Origin: *\r\n'
+)
+TEXT_HEADERS = (
+    b'Content-type: text/plain; charset=utf-8\r\n'
+    b'Access-Control-Allow-Origin: *\r\n'
+)
+
+_status_lines = {}
+_jwt = None
+
+
+def encode_token(claims):
+    """Sign a JWT with the shared key, importing PyJWT on first use"""
+    global _jwt
+    if _jwt is None:
+        import jwt
+        _jwt = jwt
+    return _jwt.encode(claims, SIGNING_KEY, algorithm=TOKEN_ALGORITHM)
+
+
+def token_expiry(days):
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=days)
+
+
+def make_handler(get=None, post=None):
+    """Build the ``handler`` class Vercel expects from plain route functions.
+
+    A route takes the parsed JSON body (``{}`` for GET) and returns
+    ``(status, body)``; a dict body is sent as JSON, a str as plain text.
+    Uncaught exceptions become a 500 with ``{"error": str(e)}``.
+    """
+    routes = {'GET': get, 'POST': post}
+    allowed = ', '.join([method for method, route in routes.items() if route] + ['OPTIONS'])
+    options_block = _status_line(200) + (
+        'Access-Control-Allow-Origin: *\r\n'
+        f'Access-Control-Allow-Methods: {allowed}\r\n'
+        'Access-Control-Allow-Headers: Content-Type\r\n'
+        'Content-Length: 0\r\n\r\n'
+    ).encode()
+
+    class handler(BaseHTTPRequestHandler):
+        def do_OPTIONS(self):
+            self.wfile.write(options_block)
+
+        def _dispatch(self, route, read_body):
+            try:
+                data = _read_json(self) if read_body else {}
+                status, body = route(data)
+            except Exception as e:
+                status, body = 500, {"error": str(e)}
+            _send(self, status, body)
+
+        if get:
+            def do_GET(self):
+                self._dispatch(get, read_body=False)
+
+        if post:
+            def do_POST(self):
+                self._dispatch(post, read_body=True)
+
+    return handler
+
+
+def _status_line(status):
+    line = _status_lines.get(status)
+    if line is None:
+        line = f'HTTP/1.0 {status} {HTTPStatus(status).phrase}\r\n'.encode()
+        _status_lines[status] = line
+    return line
+
+
+def _read_json(request_handler):
+    content_length = int(request_handler.headers['Content-Length'])
+    return json.loads(request_handler.rfile.read(content_length).decode('utf-8'))
+
+
+def _send(request_handler, status, body):
+    if isinstance(body, str):
+        headers, payload = TEXT_HEADERS, body.encode('utf-8')
+    else:
+        headers, payload = JSON_HEADERS, json.dumps(body).encode()
+    request_handler.wfile.write(b''.join((
+        _status_line(status),
+        headers,
+        b'Content-Length: %d\r\n\r\n' % len(payload),
+        payload,
+    )))
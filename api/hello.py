@@ -1,6 +1,8 @@
-def handler(request):
-    return {
-        'statusCode': 200,
-        'body': 'Hello from Python API!'
-    }
+from api._router import make_handler
 
+
+def hello(data):
+    return 200, 'Hello from Python API!'
+
+
+handler = make_handler(get=hello)
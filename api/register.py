@@ -1,61 +1,23 @@
-from http.server import BaseHTTPRequestHandler
-import json
-import jwt
-import datetime
+from api._router import make_handler, encode_token, token_expiry
 
-class handler(BaseHTTPRequestHandler):
-    def do_POST(self):
-        try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            email = data.get('email')
-            password = data.get('password')
-            
-            if not email or not password:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                response = {"error": "Email and password required"}
-                self.wfile.write(json.dumps(response).encode())
-                return
-            
-            # For demo purposes, just return success
-            token = jwt.encode({
-                'email': email,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(days=30)
-            }, 'demo-secret-key', algorithm='HS256')
-            
-            self.send_response(201)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            response = {
-                "message": "Registration successful",
-                "token": token,
-                "user": {"email": email}
-            }
-            
-            self.wfile.write(json.dumps(response).encode())
-            return
-            
-        except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {"error": str(e)}
-            self.wfile.write(json.dumps(response).encode())
-            return
+
+def register(data):
+    email = data.get('email')
+    password = data.get('password')
+    
+    if not email or not password:
+        return 400, {"error": "Email and password required"}
     
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-        return
+    # For demo purposes, just return success
+    token = encode_token({
+        'email': email,
+        'exp': token_expiry(days=30)
+    })
+    return 201, {
+        "message": "Registration successful",
+        "token": token,
+        "user": {"email": email}
+    }
+
 
+handler = make_handler(post=register)
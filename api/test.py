@@ -1,35 +1,15 @@
-from http.server import BaseHTTPRequestHandler
-import json
+from api._router import make_handler
 import datetime
 
-class handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        
-        response = {
-            "message": "API is working!",
-            "method": "GET",
-            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
-        }
-        
-        self.wfile.write(json.dumps(response).encode())
-        return
-    
-    def do_POST(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        
-        response = {
+
+def status(method):
+    def route(data):
+        return 200, {
             "message": "API is working!",
-            "method": "POST",
+            "method": method,
             "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
         }
-        
-        self.wfile.write(json.dumps(response).encode())
-        return
+    return route
+
 
+handler = make_handler(get=status("GET"), post=status("POST"))
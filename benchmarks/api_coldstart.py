@@ -0,0 +1,74 @@
+"""Cold-start timing harness for the Vercel functions in api/.
+
+Each sample runs in a fresh interpreter, imports one entry point and serves a
+single request through its ``handler`` class over a socketpair, the way the
+runtime's first invocation would. Reports median import time, first-request
+time and whole-process wall time per function.
+
+    python benchmarks/api_coldstart.py [--runs 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTIONS = {
+    'api.hello': ('GET', None),
+    'api.test': ('GET', None),
+    'api.login': ('POST', {'email': 'bench@lifebooks.ai', 'password': 'secret123'}),
+    'api.register': ('POST', {'email': 'bench@lifebooks.ai', 'password': 'secret123'}),
+}
+
+CHILD = r'''
+import importlib, json, socket, sys, time
+module_name, method, body = sys.argv[1], sys.argv[2], sys.argv[3]
+start = time.perf_counter()
+module = importlib.import_module(module_name)
+imported = time.perf_counter()
+payload = body.encode()
+raw = f"{method} / HTTP/1.0\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload
+client, server = socket.socketpair()
+client.sendall(raw)
+client.shutdown(socket.SHUT_WR)
+class Server:
+    server_name, server_port = 'bench', 0
+module.handler(server, ('127.0.0.1', 0), Server())
+server.close()
+served = time.perf_counter()
+status = client.recv(64).split(b' ', 2)[1].decode()
+print(json.dumps({"import_ms": (imported - start) * 1000, "request_ms": (served - imported) * 1000, "status": status}))
+'''
+
+
+def run_once(module_name, method, body):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, module_name, method, json.dumps(body) if body else ''],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output)
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'function':<14}{'status':>7}{'import ms':>12}{'request ms':>12}{'process ms':>12}")
+    for module_name, (method, body) in FUNCTIONS.items():
+        samples = [run_once(module_name, method, body) for _ in range(args.runs)]
+        print(f"{module_name:<14}{samples[0]['status']:>7}"
+              f"{statistics.median(s['import_ms'] for s in samples):>12.2f}"
+              f"{statistics.median(s['request_ms'] for s in samples):>12.2f}"
+              f"{statistics.median(s['process_ms'] for s in samples):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Bytes and latency saved by sending WAV audio as 16 kHz mono.
+
+Writes a synthetic browser-style recording (48 kHz stereo 16-bit WAV) and
+transcribes it with the offline FakeTranscriber, whose latency stands in
+for uploading at ``--bandwidth`` bytes per second, once as uploaded and
+once normalized. Reports bytes sent and end-to-end time for each.
+
+    python benchmarks/bench_audio_normalization.py [--minutes 20] [--bandwidth 2000000]
+"""
+import argparse
+import array
+import concurrent.futures
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from transcription import FakeTranscriber, transcribe_file
+
+RATE = 48000
+
+
+class CountingTranscriber(FakeTranscriber):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bytes_sent = 0
+
+    def transcribe(self, audio_file):
+        self.bytes_sent += os.fstat(audio_file.fileno()).st_size
+        return super().transcribe(audio_file)
+
+
+def write_recording(path, seconds, rng):
+    # A few seconds of stereo noise, repeated
+    block = array.array('h', (rng.randint(-6000, 6000) for _ in range(RATE * 2 * 2))).tobytes()
+    with wave.open(path, 'wb') as audio:
+        audio.setnchannels(2)
+        audio.setsampwidth(2)
+        audio.setframerate(RATE)
+        for _ in range(int(seconds // 2)):
+            audio.writeframes(block)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=20)
+    parser.add_argument('--sample-rate', type=int, default=16000)
+    parser.add_argument('--segment-seconds', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--bandwidth', type=float, default=2000000, help='simulated upload bytes per second')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'recording.wav')
+        write_recording(path, args.minutes * 60, random.Random(7))
+        print(f"recording: {args.minutes:g} min, 48 kHz stereo, {os.path.getsize(path) / 2**20:.0f} MiB")
+
+        results = {}
+        for label, sample_rate in (('as uploaded', None), (f'{args.sample_rate} Hz mono', args.sample_rate)):
+            transcriber = CountingTranscriber(upload_bytes_per_second=args.bandwidth)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+                started = time.perf_counter()
+                transcribe_file(path, transcriber, executor, args.segment_seconds, sample_rate=sample_rate)
+                elapsed = time.perf_counter() - started
+            results[label] = (transcriber.bytes_sent, elapsed)
+            print(f"{label}: sent {transcriber.bytes_sent / 2**20:.1f} MiB in {elapsed:.2f}s")
+
+        (raw_bytes, raw_time), (small_bytes, small_time) = results.values()
+        print(f"saved {(raw_bytes - small_bytes) / 2**20:.1f} MiB ({1 - small_bytes / raw_bytes:.0%}), "
+              f"latency {small_time - raw_time:+.2f}s ({small_time / raw_time - 1:+.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Storage and reconstruction benchmark for chunked AutoSave snapshots.
+
+Builds a synthetic book-length story, applies a small edit between each
+auto-save the way an editing session would, and stores every snapshot
+through models.AutoSave. Reports bytes stored per snapshot against full
+copies, chunking time and snapshot reconstruction latency.
+
+    python benchmarks/bench_autosave_chunks.py [--words 100000] [--snapshots 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from flask import Flask
+import models
+from models import db, User, Story, AutoSave, ContentChunk, AutoSaveChunk
+
+WORDS = ('the morning we left the farm my mother packed bread and cheese while father '
+         'checked the horses and I remember the smell of rain on the dry road').split()
+
+
+def make_text(rng, words):
+    sentences = []
+    count = 0
+    while count < words:
+        length = rng.randint(6, 24)
+        sentences.append(' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.')
+        count += length
+        if rng.random() < 0.15:
+            sentences[-1] += '\n\n'
+    return ' '.join(sentences)
+
+
+def edit(rng, text):
+    position = rng.randrange(len(text))
+    insertion = ' ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+    return text[:position] + insertion + text[position:]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=100000)
+    parser.add_argument('--snapshots', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    models.init_app(app)
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@lifebooks.ai', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        story = Story(user_id=user.id, title='Benchmark')
+        db.session.add(story)
+        db.session.commit()
+
+        text = make_text(rng, args.words)
+        full_bytes = 0
+        save_times = []
+        for _ in range(args.snapshots):
+            text = edit(rng, text)
+            full_bytes += len(text.encode('utf-8'))
+            started = time.perf_counter()
+            story.auto_save_content(text)
+            save_times.append(time.perf_counter() - started)
+
+        chunk_bytes = db.session.query(db.func.sum(db.func.length(ContentChunk.data))).scalar()
+        chunk_count = ContentChunk.query.count()
+        ref_count = AutoSaveChunk.query.count()
+        # Each reference row is three integers; count 8 bytes apiece
+        stored_bytes = chunk_bytes + ref_count * 24
+
+        load_times = []
+        snapshots = AutoSave.query.all()
+        for snapshot in snapshots:
+            db.session.expire_all()
+            started = time.perf_counter()
+            content = snapshot.get_content()
+            load_times.append(time.perf_counter() - started)
+        assert content == text
+
+    print(f"story size:              {len(text.encode('utf-8')) / 1024:.1f} KiB ({args.words} words)")
+    print(f"snapshots:               {args.snapshots}")
+    print(f"full copies:             {full_bytes / args.snapshots / 1024:.1f} KiB/snapshot")
+    print(f"chunked:                 {stored_bytes / args.snapshots / 1024:.1f} KiB/snapshot "
+          f"({chunk_count} chunks, {ref_count} refs)")
+    print(f"save latency p50/p95:    {statistics.median(save_times) * 1000:.1f} / {percentile(save_times, 0.95) * 1000:.1f} ms")
+    print(f"rebuild latency p50/p95: {statistics.median(load_times) * 1000:.1f} / {percentile(load_times, 0.95) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Splitting and concurrency benchmark for chunked transcription.
+
+Writes a synthetic recording (16 kHz mono WAV, noise bursts standing in
+for speech between quiet pauses), splits it at pauses and transcribes the
+segments with the offline FakeTranscriber, whose latency is proportional
+to audio length. Reports split time, how many cuts landed in a pause, and
+wall time for one worker against a bounded pool.
+
+    python benchmarks/bench_chunked_transcription.py [--minutes 60] [--workers 1 4 8]
+"""
+import argparse
+import array
+import concurrent.futures
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from audio_segments import split_wav
+from transcription import FakeTranscriber, transcribe_file
+
+RATE = 16000
+BLOCK = RATE // 10  # 100 ms
+
+
+def make_blocks(rng, amplitude, count=8):
+    return [array.array('h', (rng.randint(-amplitude, amplitude) for _ in range(BLOCK))).tobytes() for _ in range(count)]
+
+
+def write_recording(path, seconds, rng):
+    """Write the recording; returns the pauses as (start, end) seconds"""
+    speech, quiet = make_blocks(rng, 8000), make_blocks(rng, 60)
+    pauses = []
+    position = 0  # in blocks
+    with wave.open(path, 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(RATE)
+        while position < seconds * 10:
+            for _ in range(rng.randint(20, 80)):
+                audio.writeframes(rng.choice(speech))
+            pause = rng.randint(4, 15)
+            start = audio.tell() / RATE
+            for _ in range(pause):
+                audio.writeframes(rng.choice(quiet))
+            pauses.append((start, audio.tell() / RATE))
+            position = audio.tell() // BLOCK
+    return pauses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--segment-seconds', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--latency', type=float, default=0.002, help='fake transcription seconds per audio second')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'recording.wav')
+        pauses = write_recording(path, args.minutes * 60, rng)
+        print(f"recording: {args.minutes:g} min, {os.path.getsize(path) / 2**20:.0f} MiB")
+
+        started = time.perf_counter()
+        rate, cuts = split_wav(path, args.segment_seconds)
+        print(f"split: {len(cuts)} segments in {(time.perf_counter() - started) * 1000:.0f} ms")
+        inner = [start / rate for start, _end in cuts[1:]]
+        in_pause = sum(any(begin <= cut <= end for begin, end in pauses) for cut in inner)
+        print(f"cuts inside a pause: {in_pause}/{len(inner)}")
+
+        transcriber = FakeTranscriber(args.latency)
+        for workers in args.workers:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                started = time.perf_counter()
+                text, segments, duration = transcribe_file(path, transcriber, executor, args.segment_seconds)
+                elapsed = time.perf_counter() - started
+            contiguous = all(a['end'] == b['start'] for a, b in zip(segments, segments[1:]))
+            print(f"workers={workers}: {elapsed:.2f}s for {duration:.0f}s of audio, "
+                  f"{len(segments)} segments, contiguous and ordered: {contiguous}")
+
+
+if __name__ == '__main__':
+    main()
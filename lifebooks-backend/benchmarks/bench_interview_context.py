@@ -0,0 +1,99 @@
+"""Prompt tokens per turn over a long interview: last-10 window vs budget.
+
+Plays a synthetic interview (storyteller answers of 40-600 words, replies
+from the offline FakeChat) and builds each turn's prompt two ways: the
+previous system prompt plus last 10 messages, and interview_context's
+budgeted window with a running summary. Reports prompt tokens per turn,
+the tokens sent to update the summary on the turns that did, and how
+many of the conversation's messages each prompt still covers.
+
+    python benchmarks/bench_interview_context.py [--turns 50] [--budget 3000]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from interview_context import fit_context
+from llm import FakeChat, estimate_tokens
+
+SYSTEM_PROMPT = (
+    "You are a professional ghostwriter who specializes in helping people tell their most important stories. "
+    "You conduct empathetic, caring interviews that feel like conversations with a trusted friend. " * 3
+)
+WORDS = ('grandmother', 'farm', 'winter', 'letters', 'war', 'harbor', 'wedding', 'school', 'bakery', 'we', 'and', 'the')
+
+
+class CountingChat(FakeChat):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prompt_tokens = 0
+
+    def _complete(self, messages, model, max_tokens, temperature, timeout):
+        completion = super()._complete(messages, model, max_tokens, temperature, timeout)
+        self.prompt_tokens += completion.prompt_tokens
+        return completion
+
+
+def prompt_tokens(messages):
+    return estimate_tokens(' '.join(message['content'] for message in messages))
+
+
+def last_ten(session):
+    return [{"role": "system", "content": session['system_prompt']}] + [
+        {"role": "user" if message['role'] == 'user' else "assistant", "content": message['content']}
+        for message in session['messages'][-10:]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--budget', type=int, default=3000)
+    parser.add_argument('--summary-tokens', type=int, default=400)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    llm = CountingChat(tokens=120)
+    old = {'system_prompt': SYSTEM_PROMPT, 'messages': []}
+    new = {'system_prompt': SYSTEM_PROMPT, 'messages': [], 'summary': '', 'summarized': 0}
+
+    print(f"{'turn':>4} {'last-10':>8} {'budgeted':>9} {'+summary':>9} {'covered (last-10 / budgeted)':>30}")
+    totals = {'old': [], 'new': [], 'summary': []}
+    for turn in range(1, args.turns + 1):
+        answer = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 600)))
+        for session in (old, new):
+            session['messages'].append({'role': 'user', 'content': answer})
+
+        old_prompt = last_ten(old)
+        llm.prompt_tokens = 0
+        new_prompt = fit_context(new, llm, 'fake', budget=args.budget, summary_tokens=args.summary_tokens)
+        old_tokens = prompt_tokens(old_prompt)
+        new_tokens = prompt_tokens(new_prompt)
+        summary_tokens = llm.prompt_tokens  # the summary update, if this turn made one
+        totals['old'].append(old_tokens)
+        totals['new'].append(new_tokens)
+        totals['summary'].append(summary_tokens)
+
+        reply = llm.complete(new_prompt, 'fake').text
+        for session in (old, new):
+            session['messages'].append({'role': 'ai', 'content': reply})
+
+        # Messages in the prompt, verbatim or summarized, out of all before the reply
+        covered_old = len(old_prompt) - 1
+        covered_new = new['summarized'] + len(new_prompt) - (2 if new['summary'] else 1)
+        covered = f"{covered_old} / {covered_new} of {len(old['messages']) - 1}"
+        if turn % 5 == 0 or turn == 1:
+            print(f"{turn:>4} {old_tokens:>8} {new_tokens:>9} {summary_tokens:>9} {covered:>30}")
+
+    for label, key in (('last-10', 'old'), ('budgeted', 'new'), ('summary updates', 'summary')):
+        values = totals[key]
+        print(f"{label}: mean {sum(values) / len(values):.0f} tokens/turn, max {max(values)}, total {sum(values)}")
+    print(f"budgeted incl. summary updates: mean {(sum(totals['new']) + sum(totals['summary'])) / args.turns:.0f} tokens/turn")
+    print(f"summary: {estimate_tokens(new['summary'])} tokens covering {new['summarized']} messages")
+
+
+if __name__ == '__main__':
+    main()
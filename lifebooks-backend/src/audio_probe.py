@@ -0,0 +1,395 @@
+"""Header-only probing of uploaded audio.
+
+Identifies the container from its signature, whatever the file is named,
+and reads duration, sample rate, channels and codec from the container
+headers: WAV fmt/data chunks, FLAC STREAMINFO, MP3 frame headers with
+their Xing/VBRI tag, MP4 mvhd/stsd boxes and WebM Info/Tracks elements.
+Files are walked with seeks, so the cost depends on the headers, not on
+the length of the recording.
+"""
+import io
+import struct
+from collections import namedtuple
+
+AudioInfo = namedtuple('AudioInfo', ['format', 'codec', 'duration', 'sample_rate', 'channels'])
+
+HEAD_SIZE = 64 * 1024  # bytes of an upload checked before the rest is read
+
+
+class AudioProbeError(Exception):
+    """The file is not audio we can accept.
+
+    Deliberately not a ValueError: werkzeug's form parser swallows those.
+    """
+
+
+class _Truncated(Exception):
+    pass
+
+
+def probe_audio(f, size):
+    """Probe a complete, seekable file of ``size`` bytes; raises AudioProbeError"""
+    try:
+        return _probe(f, size)
+    except _Truncated:
+        raise AudioProbeError("Audio file is truncated")
+
+
+def check_audio_head(head):
+    """Check the first bytes of an upload.
+
+    Raises AudioProbeError if they can't start an audio file; returns the
+    AudioInfo if the headers fit in ``head``, else None. Durations that
+    need the file size (MP3 without a VBR tag) are None.
+    """
+    try:
+        return _probe(io.BytesIO(head), None)
+    except _Truncated:
+        return None
+
+
+def _probe(f, size):
+    f.seek(0)
+    signature = f.read(12)
+    if signature[:4] == b'RIFF' and signature[8:12] == b'WAVE':
+        return _probe_wav(f, size)
+    if signature[:4] == b'fLaC':
+        return _probe_flac(f)
+    if signature[4:8] == b'ftyp':
+        return _probe_mp4(f, size)
+    if signature[:4] == b'\x1a\x45\xdf\xa3':
+        return _probe_webm(f, size)
+    if signature[:3] == b'ID3' or (len(signature) >= 2 and signature[0] == 0xFF and signature[1] & 0xE0 == 0xE0):
+        return _probe_mp3(f, size)
+    if len(signature) < 12 and size is None:
+        raise _Truncated()
+    raise AudioProbeError("Not a supported audio file (mp3, wav, mp4, m4a, webm or flac)")
+
+
+def _read(f, count):
+    data = f.read(count)
+    if len(data) < count:
+        raise _Truncated()
+    return data
+
+
+# WAV
+
+_WAV_CODECS = {1: 'pcm', 3: 'float', 6: 'alaw', 7: 'mulaw', 0x55: 'mp3'}
+
+
+def _probe_wav(f, size):
+    f.seek(12)
+    fmt = None
+    while True:
+        chunk_id, chunk_size = struct.unpack('<4sI', _read(f, 8))
+        start = f.tell()
+        if chunk_id == b'fmt ':
+            tag, channels, rate, byte_rate = struct.unpack('<HHII', _read(f, 12))
+            if tag == 0xFFFE and chunk_size >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                f.seek(start + 24)
+                tag = struct.unpack('<H', _read(f, 2))[0]
+            fmt = (_WAV_CODECS.get(tag, f'0x{tag:04x}'), channels, rate, byte_rate)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise AudioProbeError("WAV file has no format chunk")
+            codec, channels, rate, byte_rate = fmt
+            if not channels or not rate or not byte_rate:
+                raise AudioProbeError("WAV file has an invalid format chunk")
+            # Streamed recorders leave the size as 0 or 0xFFFFFFFF
+            if size is not None and (chunk_size in (0, 0xFFFFFFFF) or start + chunk_size > size):
+                chunk_size = size - start
+            elif chunk_size in (0, 0xFFFFFFFF):
+                chunk_size = None
+            duration = chunk_size / byte_rate if chunk_size is not None else None
+            return AudioInfo('wav', codec, duration, rate, channels)
+        f.seek(start + chunk_size + (chunk_size & 1))
+
+
+# FLAC
+
+def _probe_flac(f):
+    f.seek(4)
+    header = _read(f, 4)
+    if header[0] & 0x7F != 0:
+        raise AudioProbeError("FLAC file has no STREAMINFO block")
+    info = _read(f, 34)
+    packed = int.from_bytes(info[10:18], 'big')
+    rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if not rate:
+        raise AudioProbeError("FLAC file has an invalid sample rate")
+    return AudioInfo('flac', 'flac', total_samples / rate if total_samples else None, rate, channels)
+
+
+# MP3
+
+_MP3_BITRATES = {
+    (3, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_MP3_SYNC_SEARCH = 4096  # bytes of padding tolerated before the first frame
+
+
+def _mp3_frame(header):
+    """(bitrate kbps, sample rate, channels, samples per frame, frame length, side info length) or None"""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 3  # 3 = MPEG 1, 2 = MPEG 2, 0 = MPEG 2.5
+    layer = (header[1] >> 1) & 3  # 3 = layer I, 2 = II, 1 = III
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[(3 if version == 3 else 2, layer)][bitrate_index]
+    rate = _MP3_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 1
+    channels = 1 if header[3] >> 6 == 3 else 2
+    if layer == 3:
+        samples, length = 384, (12 * bitrate * 1000 // rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 3 else 576
+        length = samples // 8 * bitrate * 1000 // rate + padding
+    if version == 3:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    return bitrate, rate, channels, samples, length, side_info
+
+
+def _probe_mp3(f, size):
+    f.seek(0)
+    start = 0
+    header = _read(f, 10)
+    if header[:3] == b'ID3':
+        tag_size = ((header[6] & 0x7F) << 21) | ((header[7] & 0x7F) << 14) | ((header[8] & 0x7F) << 7) | (header[9] & 0x7F)
+        start = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+
+    # The first frame, confirmed by the frame right after it
+    f.seek(start)
+    window = f.read(_MP3_SYNC_SEARCH)
+    frame = None
+    for offset in range(max(len(window) - 3, 0)):
+        if window[offset] != 0xFF:
+            continue
+        frame = _mp3_frame(window[offset:offset + 4])
+        if frame is None:
+            continue
+        f.seek(start + offset + frame[4])
+        following = f.read(4)
+        if len(following) < 4 and size is None:
+            raise _Truncated()
+        if len(following) < 4 or _mp3_frame(following) is not None:
+            start += offset
+            break
+        frame = None
+    if frame is None:
+        if size is None and len(window) < _MP3_SYNC_SEARCH:
+            raise _Truncated()
+        raise AudioProbeError("No MP3 audio frames found")
+
+    bitrate, rate, channels, samples, _length, side_info = frame
+    codec = 'mp3'
+    f.seek(start + 4 + side_info)
+    tag = f.read(12)
+    frames = None
+    if tag[:4] in (b'Xing', b'Info') and len(tag) == 12 and struct.unpack('>I', tag[4:8])[0] & 1:
+        frames = struct.unpack('>I', tag[8:12])[0]
+    else:
+        f.seek(start + 36)
+        vbri = f.read(18)
+        if vbri[:4] == b'VBRI' and len(vbri) == 18:
+            frames = struct.unpack('>I', vbri[14:18])[0]
+    if frames:
+        duration = frames * samples / rate
+    elif size is not None:
+        duration = (size - start) * 8 / (bitrate * 1000)  # constant bitrate
+    else:
+        duration = None
+    return AudioInfo('mp3', codec, duration, rate, channels)
+
+
+# MP4 / M4A
+
+def _boxes(f, start, end):
+    """(type, payload start, box end) of the boxes between start and end"""
+    position = start
+    while end is None or position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            if end is None and header:
+                raise _Truncated()
+            return
+        box_size, box_type = struct.unpack('>I4s', header)
+        payload = position + 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', _read(f, 8))[0]
+            payload += 8
+        elif box_size == 0:
+            if end is None:
+                raise _Truncated()
+            box_size = end - position
+        if box_size < payload - position:
+            raise AudioProbeError("MP4 file has an invalid box")
+        yield box_type, payload, position + box_size
+        position += box_size
+
+
+def _child(f, start, end, box_type):
+    for child_type, payload, child_end in _boxes(f, start, end):
+        if child_type == box_type:
+            return payload, child_end
+    return None
+
+
+def _probe_mp4(f, size):
+    f.seek(8)
+    major_brand = _read(f, 4)
+    audio_format = 'm4a' if major_brand == b'M4A ' else 'mp4'
+
+    moov = _child(f, 0, size, b'moov')
+    if moov is None:
+        if size is None:
+            raise _Truncated()
+        raise AudioProbeError("MP4 file has no movie header")
+
+    duration = None
+    mvhd = _child(f, moov[0], moov[1], b'mvhd')
+    if mvhd:
+        f.seek(mvhd[0])
+        version = _read(f, 1)[0]
+        if version == 1:
+            f.seek(mvhd[0] + 20)
+            timescale, length = struct.unpack('>IQ', _read(f, 12))
+        else:
+            f.seek(mvhd[0] + 12)
+            timescale, length = struct.unpack('>II', _read(f, 8))
+        if timescale:
+            duration = length / timescale
+
+    for box_type, payload, end in _boxes(f, moov[0], moov[1]):
+        if box_type != b'trak':
+            continue
+        mdia = _child(f, payload, end, b'mdia')
+        hdlr = mdia and _child(f, mdia[0], mdia[1], b'hdlr')
+        if not hdlr:
+            continue
+        f.seek(hdlr[0] + 8)
+        if _read(f, 4) != b'soun':
+            continue
+        minf = _child(f, mdia[0], mdia[1], b'minf')
+        stbl = minf and _child(f, minf[0], minf[1], b'stbl')
+        stsd = stbl and _child(f, stbl[0], stbl[1], b'stsd')
+        if not stsd:
+            continue
+        f.seek(stsd[0] + 8)
+        entry = _read(f, 36)
+        codec = entry[4:8].decode('latin-1').strip()
+        channels = struct.unpack('>H', entry[24:26])[0]
+        rate = struct.unpack('>I', entry[32:36])[0] >> 16
+        return AudioInfo(audio_format, codec, duration, rate, channels)
+
+    raise AudioProbeError("MP4 file has no audio track")
+
+
+# WebM / Matroska
+
+_EBML_SEGMENT = 0x18538067
+_EBML_INFO = 0x1549A966
+_EBML_TRACKS = 0x1654AE6B
+_EBML_CLUSTER = 0x1F43B675
+
+
+def _vint(f, keep_marker):
+    first = _read(f, 1)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise AudioProbeError("WebM file has an invalid element")
+    value = first if keep_marker else first & (0xFF >> length)
+    unknown = not keep_marker and value == (0xFF >> length)
+    for byte in _read(f, length - 1):
+        value = (value << 8) | byte
+        unknown = unknown and byte == 0xFF
+    return None if unknown else value
+
+
+def _elements(f, start, end):
+    position = start
+    while end is None or position < end:
+        f.seek(position)
+        if not f.read(1):
+            if end is None:
+                return
+            raise _Truncated()
+        f.seek(position)
+        element_id = _vint(f, keep_marker=True)
+        element_size = _vint(f, keep_marker=False)
+        payload = f.tell()
+        element_end = None if element_size is None else payload + element_size
+        yield element_id, payload, element_end
+        if element_end is None:
+            return  # unknown size: only a container we descend into
+        position = element_end
+
+
+def _ebml_uint(f, start, end):
+    f.seek(start)
+    return int.from_bytes(_read(f, end - start), 'big')
+
+
+def _ebml_float(f, start, end):
+    f.seek(start)
+    data = _read(f, end - start)
+    return struct.unpack('>f' if len(data) == 4 else '>d', data)[0]
+
+
+def _probe_webm(f, size):
+    timecode_scale = 1000000
+    duration = None
+    for element_id, payload, end in _elements(f, 0, size):
+        if element_id != _EBML_SEGMENT:
+            continue
+        for child_id, child, child_end in _elements(f, payload, end if end is not None else size):
+            if child_id == _EBML_CLUSTER:
+                break
+            if child_id == _EBML_INFO:
+                for info_id, value, value_end in _elements(f, child, child_end):
+                    if info_id == 0x2AD7B1:
+                        timecode_scale = _ebml_uint(f, value, value_end)
+                    elif info_id == 0x4489:
+                        duration = _ebml_float(f, value, value_end)
+            elif child_id == _EBML_TRACKS:
+                for entry_id, entry, entry_end in _elements(f, child, child_end):
+                    if entry_id != 0xAE:
+                        continue
+                    track = {}
+                    for field_id, value, value_end in _elements(f, entry, entry_end):
+                        if field_id == 0x83:
+                            track['type'] = _ebml_uint(f, value, value_end)
+                        elif field_id == 0x86:
+                            f.seek(value)
+                            track['codec'] = _read(f, value_end - value).decode('ascii', 'replace').rstrip('\x00')
+                        elif field_id == 0xE1:
+                            for audio_id, audio_value, audio_end in _elements(f, value, value_end):
+                                if audio_id == 0xB5:
+                                    track['rate'] = _ebml_float(f, audio_value, audio_end)
+                                elif audio_id == 0x9F:
+                                    track['channels'] = _ebml_uint(f, audio_value, audio_end)
+                    if track.get('type') == 2:
+                        seconds = duration * timecode_scale / 1e9 if duration else None
+                        return AudioInfo('webm', track.get('codec'), seconds,
+                                         int(track.get('rate', 8000)), track.get('channels', 1))
+                raise AudioProbeError("WebM file has no audio track")
+        break
+    if size is None:
+        raise _Truncated()
+    raise AudioProbeError("WebM file has no audio track")
@@ -0,0 +1,169 @@
+import wave
+import numpy as np
+
+WINDOW_SECONDS = 0.05  # loudness is measured per 50 ms window
+SEARCH_SECONDS = 30  # how far before the target length to look for a pause
+FILTER_TAPS = 63  # anti-aliasing low-pass applied before downsampling
+
+
+def split_wav(path, target_seconds=300, search_seconds=SEARCH_SECONDS):
+    """Cut points for splitting a PCM WAV file into segments of about
+    ``target_seconds``.
+
+    Each cut is placed in the quietest window of the ``search_seconds``
+    before the target length, i.e. in a pause between words where one
+    exists. Only the search spans are read, not the whole recording.
+
+    Returns ``(frame_rate, [(start_frame, end_frame), ...])``, or None if
+    the file is not a WAV the wave module can read (compressed formats
+    can't be cut without a decoder).
+    """
+    try:
+        with wave.open(path, 'rb') as audio:
+            rate = audio.getframerate()
+            frames = audio.getnframes()
+            target = int(target_seconds * rate)
+            search = min(int(search_seconds * rate), target // 2)
+
+            cuts = [0]
+            while frames - cuts[-1] > target:
+                ideal = cuts[-1] + target
+                cuts.append(_quietest_frame(audio, ideal - search, ideal))
+            cuts.append(frames)
+    except (wave.Error, EOFError):
+        return None
+    return rate, list(zip(cuts, cuts[1:]))
+
+
+def needs_normalizing(path, sample_rate):
+    """Whether ``write_segment(..., sample_rate=sample_rate)`` would shrink
+    the WAV at ``path``: it is above ``sample_rate``, stereo or not 16-bit,
+    and can be converted here.
+    """
+    try:
+        with wave.open(path, 'rb') as audio:
+            return _normalizable(audio.getparams(), sample_rate)
+    except (wave.Error, EOFError):
+        return False
+
+
+def write_segment(path, start, end, destination, sample_rate=None):
+    """Write frames ``start``..``end`` of the WAV at ``path`` to ``destination`` as a WAV.
+
+    With ``sample_rate``, audio above that rate, stereo or not 16-bit is
+    converted to 16-bit mono at (at most) ``sample_rate`` on the way, all
+    speech recognition needs. The conversion runs block by block as NumPy
+    array operations, carrying the resampler state across blocks.
+    """
+    with wave.open(path, 'rb') as source:
+        params = source.getparams()
+        normalize = sample_rate and _normalizable(params, sample_rate)
+        rate = min(params.framerate, sample_rate) if normalize else params.framerate
+        resampler = _Resampler(params.framerate, rate) if normalize and rate != params.framerate else None
+        source.setpos(start)
+        with wave.open(destination, 'wb') as target:
+            if normalize:
+                target.setparams(params._replace(nchannels=1, sampwidth=2, framerate=rate, nframes=0))
+            else:
+                target.setparams(params)
+            remaining = end - start
+            block = params.framerate * 10
+            while remaining > 0:
+                count = min(block, remaining)
+                data = source.readframes(count)
+                if not data:
+                    break
+                if normalize:
+                    data = _normalize(data, params, resampler)
+                target.writeframes(data)
+                remaining -= count
+
+
+def _normalizable(params, sample_rate):
+    if params.comptype != 'NONE' or params.nchannels > 2 or params.sampwidth > 4:
+        return False
+    return params.framerate > sample_rate or params.nchannels == 2 or params.sampwidth != 2
+
+
+def _normalize(data, params, resampler):
+    # Downmix to mono, resample, and back to 16-bit little-endian samples
+    samples = _samples(data, params.sampwidth)
+    if params.nchannels == 2:
+        samples = (samples[0::2] + samples[1::2]) * 0.5
+    if resampler:
+        samples = resampler.process(samples)
+    return np.clip(np.rint(samples), -32768, 32767).astype('<i2').tobytes()
+
+
+def _samples(data, width):
+    # PCM frames as float64 on the 16-bit scale, whatever the sample width
+    if width == 1:
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.float64) - 128) * 256  # 8-bit WAV is unsigned
+    if width == 2:
+        return np.frombuffer(data, dtype='<i2').astype(np.float64)
+    if width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        value = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        return np.where(value >= 1 << 23, value - (1 << 24), value) / 256.0
+    return np.frombuffer(data, dtype='<i4') / 65536.0
+
+
+class _Resampler:
+    """Streaming resampler: a windowed-sinc low-pass below the new Nyquist
+    frequency, then the filtered signal taken at the new sample times. For
+    whole-number ratios (48 kHz to 16 kHz) only every ``step``-th filtered
+    sample is computed; other ratios interpolate linearly between filtered
+    samples. Filter history and the position of the next output sample
+    carry over from block to block, so blocks join without clicks.
+    """
+
+    def __init__(self, source_rate, rate, taps=FILTER_TAPS):
+        self.step = source_rate / rate
+        cutoff = 0.5 * rate / source_rate  # cycles per input sample
+        offsets = np.arange(taps) - (taps - 1) / 2
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * offsets) * np.hamming(taps)
+        self.kernel = kernel / kernel.sum()  # symmetric, so correlation is convolution
+        self.history = np.zeros(taps - 1)
+        self.last = np.zeros(0)  # the previous block's last filtered sample
+        self.position = 0.0  # of the next output sample, in filtered samples from last
+
+    def process(self, samples):
+        buffered = np.concatenate((self.history, samples))
+        self.history = buffered[len(buffered) - len(self.history):]
+        if self.step.is_integer():
+            windows = np.lib.stride_tricks.sliding_window_view(buffered, len(self.kernel))
+            step = int(self.step)
+            first = int(self.position)
+            resampled = windows[first::step] @ self.kernel
+            self.position = first + len(resampled) * step - len(windows)
+            return resampled
+
+        filtered = np.concatenate((self.last, np.convolve(buffered, self.kernel, mode='valid')))
+        if len(filtered) < 2:
+            self.last = filtered
+            return filtered[:0]
+        times = np.arange(self.position, len(filtered) - 1, self.step)
+        index = times.astype(np.int64)
+        fraction = times - index
+        resampled = filtered[index] * (1 - fraction) + filtered[index + 1] * fraction
+        self.position = (times[-1] + self.step if len(times) else self.position) - (len(filtered) - 1)
+        self.last = filtered[-1:]
+        return resampled
+
+
+def _quietest_frame(audio, start, end):
+    width = audio.getsampwidth()
+    channels = audio.getnchannels()
+    window = max(int(audio.getframerate() * WINDOW_SECONDS), 1)
+    if width > 4:
+        return end  # sample format we can't measure; cut at the target
+    audio.setpos(start)
+    data = audio.readframes(end - start)
+
+    # Mean square loudness of every whole window, in one pass over the span
+    windows = len(data) // (window * width * channels)
+    if not windows:
+        return end
+    samples = _samples(data[:windows * window * width * channels], width)
+    levels = np.mean(np.square(samples).reshape(windows, -1), axis=1)
+    return start + int(np.argmin(levels)) * window + window // 2
@@ -0,0 +1,49 @@
+import re
+import zlib
+
+# Chunk size bounds, in characters
+MIN_CHUNK_SIZE = 512
+MAX_CHUNK_SIZE = 8192
+# A sentence ends a chunk when the low bits of its hash are zero (1 in 8)
+BOUNDARY_MASK = 0x7
+
+# A sentence or line together with its terminator and trailing whitespace
+_PIECE = re.compile(r'[^.!?\n]*(?:[.!?\n]+\s*|$)')
+
+
+def split_chunks(text):
+    """Split text into content-defined chunks.
+
+    Chunk boundaries are chosen by hashing each sentence (the rolling window)
+    instead of by position, so an edit only changes the chunk it falls in;
+    the chunks after it split exactly as before. Scanning happens per
+    sentence with regex and crc32, so it stays fast on book-length text.
+    Joining the chunks returns the original text.
+    """
+    chunks = []
+    current = []
+    size = 0
+
+    for match in _PIECE.finditer(text):
+        piece = match.group()
+        if not piece:
+            continue
+
+        # Text without sentence breaks is cut at the maximum size
+        while size + len(piece) > MAX_CHUNK_SIZE:
+            cut = MAX_CHUNK_SIZE - size
+            current.append(piece[:cut])
+            chunks.append(''.join(current))
+            current, size, piece = [], 0, piece[cut:]
+        if not piece:
+            continue
+
+        current.append(piece)
+        size += len(piece)
+        if size >= MIN_CHUNK_SIZE and zlib.crc32(piece.encode('utf-8')) & BOUNDARY_MASK == 0:
+            chunks.append(''.join(current))
+            current, size = [], 0
+
+    if current:
+        chunks.append(''.join(current))
+    return chunks
@@ -0,0 +1,94 @@
+import gzip
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Content types worth compressing; audio and PDFs are already compressed
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def coded_etags(etag):
+    """The ETag and its per-encoding variants.
+
+    A compressed body is a different representation, so it gets its own
+    strong ETag (``<etag>-gzip``); a client may send either back.
+    """
+    return (etag,) + tuple(f'{etag}-{encoding}' for encoding in supported_encodings())
+
+
+def register_compression(app, min_size=1024, level=6):
+    """Compress responses for clients that accept it.
+
+    Buffered bodies smaller than ``min_size`` bytes are sent as they are.
+    Streamed bodies are always compressed, chunk by chunk, with a sync flush
+    after every chunk so items still reach the client as they are produced.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(supported_encodings())
+        if not encoding:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(body, quality=min(level, 11)))
+            else:
+                response.set_data(gzip.compress(body, compresslevel=level))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        return response
+
+    return compress_response
+
+
+def _compress_stream(chunks, encoding, level):
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=min(level, 11))
+            for chunk in chunks:
+                data = compressor.process(_to_bytes(chunk)) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                data = compressor.compress(_to_bytes(chunk)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+    finally:
+        # Close the wrapped body so its cleanup (app context, DB cursor) runs
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _to_bytes(chunk):
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
@@ -0,0 +1,89 @@
+from llm import estimate_tokens
+
+MESSAGE_OVERHEAD = 4  # tokens of role and framing per chat message
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep a running summary of a life-story interview. Update the summary with the new turns, "
+    "keeping the names, dates, places, events and feelings the storyteller shared and the questions "
+    "already asked. Reply with the updated summary only, in at most {words} words."
+)
+
+
+def fit_context(session, llm, model, budget=3000, summary_tokens=400, keep_recent=2):
+    """Prompt messages for the session's next reply, within about ``budget`` tokens.
+
+    The newest messages are sent verbatim. When they no longer fit, the
+    oldest are folded into ``session['summary']``: the summarizer sees the
+    previous summary and the folded turns only, so each update costs about
+    the same however long the interview runs. Enough turns are folded to
+    bring the window down to half its budget, so a summary is written every
+    few turns rather than on every turn. ``session['summarized']`` counts
+    the messages already in the summary.
+
+    If summarizing fails, older messages are dropped for this reply instead.
+    """
+    summary = session.get('summary') or ''
+    summarized = session.get('summarized', 0)
+    system = {"role": "system", "content": session['system_prompt']}
+    window_budget = max(budget - _cost([system]) - summary_tokens - MESSAGE_OVERHEAD, MESSAGE_OVERHEAD * 2)
+
+    pending = session['messages'][summarized:]
+    if _cost(pending, window_budget) > window_budget and len(pending) > keep_recent:
+        keep = max(len(_newest(pending, window_budget // 2)), keep_recent)
+        folded = pending[:-keep]
+        try:
+            summary = summarize(llm, model, summary, folded, summary_tokens, window_budget)
+        except Exception as e:
+            print(f"Interview summary error: {str(e)}")
+        else:
+            session['summary'] = summary
+            session['summarized'] = summarized + len(folded)
+            pending = pending[-keep:]
+
+    messages = [system]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the interview so far:\n{summary}"})
+    for message in _newest(pending, window_budget) or pending[-1:]:
+        messages.append({
+            "role": "user" if message['role'] == 'user' else "assistant",
+            "content": _truncate(message['content'], window_budget)
+        })
+    return messages
+
+
+def summarize(llm, model, summary, messages, summary_tokens, budget):
+    """The summary extended with ``messages``; the request stays within about ``budget`` tokens"""
+    turns = '\n\n'.join(
+        f"{'Storyteller' if message['role'] == 'user' else 'Interviewer'}: {message['content']}"
+        for message in messages
+    )
+    completion = llm.complete(
+        [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=summary_tokens * 3 // 4)},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(none yet)'}\n\nNew turns:\n{_truncate(turns, budget)}"}
+        ],
+        model=model,
+        max_tokens=summary_tokens,
+        temperature=0.3
+    )
+    return completion.text.strip()
+
+
+def _cost(messages, cap=None):
+    return sum(MESSAGE_OVERHEAD + min(estimate_tokens(message['content']), cap or float('inf')) for message in messages)
+
+
+def _newest(messages, budget):
+    # The longest run of newest messages that fits the budget
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        used += _cost([messages[index]], budget)
+        if used > budget:
+            return messages[index + 1:]
+    return messages
+
+
+def _truncate(text, tokens):
+    # Cut a single oversized message to the budget, at about 4 characters a token
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit] + ' …'
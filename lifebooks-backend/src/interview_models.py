@@ -1,4 +1,7 @@
 from models import db
+from text_stats import TextStats, update_stats
+from sqlalchemy import select
+import search_index
 from datetime import datetime, timezone
 import json
 
@@ -83,6 +86,7 @@ class InterviewResponse(db.Model):
     response_text = db.Column(db.Text)
     response_type = db.Column(db.String(50), default='text')  # text, voice, mixed
     word_count = db.Column(db.Integer, default=0)
+    character_count = db.Column(db.Integer, default=0)
     
     # Voice recording details (if applicable)
     voice_recording_id = db.Column(db.Integer, db.ForeignKey('voice_recordings.id'), nullable=True)
@@ -97,10 +101,20 @@ class InterviewResponse(db.Model):
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
     def update_word_count(self):
-        if self.response_text:
-            self.word_count = len(self.response_text.split())
-        else:
-            self.word_count = 0
+        stats = TextStats.from_text(self.response_text)
+        self.word_count = stats.words
+        self.character_count = stats.characters
+    
+    def set_response_text(self, text):
+        # Counts are updated from the changed span only; the totals are all
+        # that is stored, so start from a single-chapter view of them
+        stats = None
+        if self.response_text is not None and self.word_count is not None and self.character_count is not None:
+            stats = TextStats([[0, None, self.word_count, self.character_count]])
+        stats = update_stats(stats, self.response_text, text)
+        self.response_text = text
+        self.word_count = stats.words
+        self.character_count = stats.characters
     
     def get_key_themes(self):
         if self.key_themes:
@@ -130,6 +144,7 @@ class InterviewResponse(db.Model):
             'response_text': self.response_text,
             'response_type': self.response_type,
             'word_count': self.word_count,
+            'character_count': self.character_count,
             'sentiment': self.sentiment,
             'key_themes': self.get_key_themes(),
             'follow_up_suggestions': self.get_follow_up_suggestions(),
@@ -137,3 +152,9 @@ class InterviewResponse(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+def _response_owner(connection, response):
+    return connection.execute(
+        select(InterviewSession.user_id).where(InterviewSession.id == response.session_id)
+    ).scalar()
+
+search_index.register_searchable(InterviewResponse, 'response', title=None, body=('response_text',), owner=_response_owner)
@@ -0,0 +1,141 @@
+import datetime
+import threading
+from sqlalchemy import select, update, and_
+from timestamps import utcnow_naive
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+FINISHED = (COMPLETED, FAILED)
+
+
+class JobQueue:
+    """Background jobs stored as rows of ``model``, worked by a thread pool.
+
+    The table is the queue, so jobs survive restarts and need no broker:
+    rows move pending -> processing -> completed/failed through
+    ``processing_status``, and a worker claims a row with a conditional
+    UPDATE, so each job runs once even with several processes polling.
+    ``model`` needs ``processing_status``, ``started_at`` and ``attempts``
+    columns.
+
+    While a job runs, its worker renews ``started_at`` every third of
+    ``lease`` seconds. A job whose lease ran out belonged to a crashed
+    worker and is put back to pending; after ``max_attempts`` claims,
+    ``give_up(job_id)`` is called instead of ``handler(job_id)``. Both run
+    inside an app context.
+    """
+
+    def __init__(self, app, db, model, handler, give_up, workers=2, poll_interval=2.0, lease=60, max_attempts=3):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.handler = handler
+        self.give_up = give_up
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._stop = threading.Event()
+
+    def start(self):
+        for number in range(self.workers):
+            threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True).start()
+        return self._stop
+
+    def notify(self):
+        # Wake an idle worker in this process; other processes find the
+        # job on their next poll
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def wait_for_finished(self, timeout):
+        """Block until a job finishes in this process or ``timeout`` passes.
+
+        Jobs finished by other processes are only seen by re-checking, so
+        callers should pass short timeouts and re-read the job.
+        """
+        with self._finished:
+            self._finished.wait(timeout)
+
+    def run_once(self):
+        """Recover expired jobs, then claim and run one; returns whether a job ran"""
+        self.recover_expired()
+        job_id = self.claim()
+        if job_id is None:
+            return False
+        attempts = self.db.session.get(self.model, job_id).attempts
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True).start()
+        try:
+            if attempts > self.max_attempts:
+                self.give_up(job_id)
+            else:
+                self.handler(job_id)
+        finally:
+            done.set()
+            self.db.session.remove()
+            with self._finished:
+                self._finished.notify_all()
+        return True
+
+    def claim(self):
+        model = self.model
+        while True:
+            job_id = self.db.session.execute(
+                select(model.id).where(model.processing_status == PENDING).order_by(model.id).limit(1)
+            ).scalar()
+            if job_id is None:
+                self.db.session.rollback()
+                return None
+            claimed = self.db.session.execute(
+                update(model)
+                .where(model.id == job_id, model.processing_status == PENDING)
+                .values(processing_status=PROCESSING, started_at=utcnow_naive(), attempts=model.attempts + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.db.session.commit()
+            if claimed:
+                return job_id
+
+    def recover_expired(self):
+        model = self.model
+        cutoff = utcnow_naive() - datetime.timedelta(seconds=self.lease)
+        recovered = self.db.session.execute(
+            update(model)
+            .where(and_(model.processing_status == PROCESSING, model.started_at < cutoff))
+            .values(processing_status=PENDING)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.session.commit()
+        if recovered:
+            print(f"Job queue: recovered {recovered} abandoned {model.__tablename__} jobs")
+        return recovered
+
+    def _heartbeat(self, job_id, done):
+        model = self.model
+        while not done.wait(self.lease / 3):
+            try:
+                with self.app.app_context(), self.db.engine.begin() as connection:
+                    connection.execute(
+                        update(model)
+                        .where(model.id == job_id, model.processing_status == PROCESSING)
+                        .values(started_at=utcnow_naive())
+                    )
+            except Exception as e:
+                print(f"Job heartbeat error: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    ran = self.run_once()
+            except Exception as e:
+                print(f"Job worker error: {str(e)}")
+                ran = False
+            if not ran:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
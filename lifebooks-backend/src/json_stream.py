@@ -0,0 +1,47 @@
+import json
+
+
+def stream_json_list(key, items, trailer=None):
+    """Yield the JSON object ``{key: [...items], **trailer()}`` piece by piece.
+
+    Items are serialized one at a time as ``items`` produces them, so a list
+    read from a DB cursor is never built up in memory. ``trailer`` is called
+    once the items are exhausted and returns the remaining top-level fields,
+    e.g. a pagination cursor that depends on how many items were read.
+    """
+    yield '{' + json.dumps(key) + ': ['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item)
+    yield ']'
+    for name, value in (trailer() if trailer else {}).items():
+        yield ', ' + json.dumps(name) + ': ' + json.dumps(value)
+    yield '}'
+
+
+def stream_ndjson(items):
+    """Yield ``items`` as newline-delimited JSON, one line per item"""
+    for item in items:
+        yield json.dumps(item) + '\n'
+
+
+def sse_event(event, data):
+    """One Server-Sent Event named ``event`` carrying ``data`` as JSON"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """Yield the lines of a binary stream, read ``chunk_size`` bytes at a time.
+
+    WSGI input streams read lines a byte at a time; reading fixed-size
+    chunks and splitting them is much faster on long lines.
+    """
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import time
+import requests
+from collections import namedtuple
+from requests.adapters import HTTPAdapter
+from metrics import metrics
+
+Completion = namedtuple('Completion', ['text', 'model', 'prompt_tokens', 'completion_tokens'])
+
+
+class LLMError(Exception):
+    pass
+
+
+class ChatBackend:
+    """A chat completion backend; subclasses implement ``_complete``.
+
+    ``messages`` are OpenAI-style ``{"role", "content"}`` dicts. Calls are
+    counted in metrics (requests, errors, tokens, time, and for streams
+    the time to the first token).
+    """
+
+    def complete(self, messages, model, max_tokens=None, temperature=None, timeout=None):
+        started = time.perf_counter()
+        metrics.increment('llm_requests')
+        try:
+            completion = self._complete(messages, model, max_tokens, temperature, timeout)
+        except Exception:
+            metrics.increment('llm_errors')
+            raise
+        finally:
+            metrics.increment('llm_milliseconds', int((time.perf_counter() - started) * 1000))
+        metrics.increment('llm_prompt_tokens', completion.prompt_tokens or 0)
+        metrics.increment('llm_completion_tokens', completion.completion_tokens or 0)
+        return completion
+
+    def stream(self, messages, model, max_tokens=None, temperature=None, timeout=None):
+        """Yield the completion's text in pieces, as it is generated.
+
+        Closing the generator early (the client went away) also closes
+        the upstream request, so no more tokens are generated.
+        """
+        started = time.perf_counter()
+        metrics.increment('llm_requests')
+        metrics.increment('llm_streams')
+        metrics.increment('llm_prompt_tokens', estimate_tokens(' '.join(message['content'] for message in messages)))
+        pieces = 0
+        try:
+            for text in self._stream(messages, model, max_tokens, temperature, timeout):
+                if not pieces:
+                    metrics.increment('llm_first_token_milliseconds', int((time.perf_counter() - started) * 1000))
+                pieces += 1
+                yield text
+        except GeneratorExit:
+            metrics.increment('llm_streams_cancelled')
+            raise
+        except Exception:
+            metrics.increment('llm_errors')
+            raise
+        finally:
+            metrics.increment('llm_milliseconds', int((time.perf_counter() - started) * 1000))
+            metrics.increment('llm_completion_tokens', pieces)  # the API sends about a token per piece
+
+    def _complete(self, messages, model, max_tokens, temperature, timeout):
+        raise NotImplementedError
+
+    def _stream(self, messages, model, max_tokens, temperature, timeout):
+        raise NotImplementedError
+
+
+class OpenAIChat(ChatBackend):
+    """OpenAI chat completions over one keep-alive session.
+
+    The session, and its pool of up to ``pool_size`` connections, is
+    shared by every thread, so after the first call requests go out on an
+    already open TLS connection. Connection failures are retried; a
+    request that reached the API is not.
+    """
+
+    def __init__(self, api_key, api_base='https://api.openai.com/v1', timeout=60, pool_size=10):
+        self.api_base = api_base.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {api_key}'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _complete(self, messages, model, max_tokens, temperature, timeout):
+        response = self._post(self._payload(messages, model, max_tokens, temperature), timeout)
+        if response.status_code != 200:
+            raise LLMError(f"OpenAI API error {response.status_code}: {_error_message(response)}")
+        body = response.json()
+        usage = body.get('usage') or {}
+        return Completion(
+            body['choices'][0]['message']['content'],
+            body.get('model', model),
+            usage.get('prompt_tokens'),
+            usage.get('completion_tokens')
+        )
+
+    def _stream(self, messages, model, max_tokens, temperature, timeout):
+        payload = dict(self._payload(messages, model, max_tokens, temperature), stream=True)
+        with self._post(payload, timeout, stream=True) as response:
+            if response.status_code != 200:
+                raise LLMError(f"OpenAI API error {response.status_code}: {_error_message(response)}")
+            try:
+                for line in response.iter_lines():
+                    if not line.startswith(b'data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == b'[DONE]':
+                        return
+                    for choice in json.loads(data).get('choices') or ():
+                        text = (choice.get('delta') or {}).get('content')
+                        if text:
+                            yield text
+            except requests.RequestException as e:
+                raise LLMError(f"OpenAI stream failed: {e}") from e
+
+    def _payload(self, messages, model, max_tokens, temperature):
+        payload = {'model': model, 'messages': messages}
+        if max_tokens is not None:
+            payload['max_tokens'] = max_tokens
+        if temperature is not None:
+            payload['temperature'] = temperature
+        return payload
+
+    def _post(self, payload, timeout, stream=False):
+        try:
+            return self.session.post(
+                f'{self.api_base}/chat/completions', json=payload, timeout=timeout or self.timeout, stream=stream
+            )
+        except requests.RequestException as e:
+            raise LLMError(f"OpenAI request failed: {e}") from e
+
+
+class FakeChat(ChatBackend):
+    """Offline stand-in for the completion API, for tests and benchmarks.
+
+    Replies are deterministic: ``tokens`` words (capped by ``max_tokens``)
+    chosen from a hash of the model and messages, returned after
+    ``latency`` seconds plus ``seconds_per_token`` per word; streams send
+    the first word after ``latency`` and one word per ``seconds_per_token``
+    after that. Token counts are estimated at four characters per token.
+    """
+
+    WORDS = (
+        'memory', 'summer', 'family', 'kitchen', 'letter', 'journey', 'laughter', 'river',
+        'garden', 'morning', 'promise', 'photograph', 'harbor', 'winter', 'school', 'song',
+    )
+
+    def __init__(self, latency=0.0, tokens=50, seconds_per_token=0.0):
+        self.latency = latency
+        self.tokens = tokens
+        self.seconds_per_token = seconds_per_token
+
+    def _complete(self, messages, model, max_tokens, temperature, timeout):
+        count = min(self.tokens, max_tokens or self.tokens)
+        time.sleep(self.latency + count * self.seconds_per_token)
+        return Completion(
+            ' '.join(self._words(messages, model, count)),
+            model,
+            estimate_tokens(' '.join(message['content'] for message in messages)),
+            count
+        )
+
+    def _stream(self, messages, model, max_tokens, temperature, timeout):
+        time.sleep(self.latency)
+        words = self._words(messages, model, min(self.tokens, max_tokens or self.tokens))
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(self.seconds_per_token)
+            yield (' ' if index else '') + word
+
+    def _words(self, messages, model, count):
+        seed = hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode('utf-8')).digest()
+        words = []
+        while len(words) < count:
+            words.extend(self.WORDS[byte % len(self.WORDS)] for byte in seed)
+            seed = hashlib.sha256(seed).digest()
+        return words[:count]
+
+
+def estimate_tokens(text):
+    # About four characters per token for English text
+    return (len(text) + 3) // 4
+
+
+def _error_message(response):
+    try:
+        return response.json()['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return response.text[:200]
@@ -5,19 +5,54 @@ import jwt
 import openai
 import stripe
 import json
-import tempfile
-from flask import Flask, request, jsonify, send_file
+import base64
+import threading
+import click
+import concurrent.futures
+import hashlib
+import itertools
+import secrets
+import shutil
+import time
+import re
+import unicodedata
+from flask import Flask, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, update, case, or_, and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import RequestEntityTooLarge
+from token_cache import TokenCache
+from memory_cache import LRUCache
+from password_hashing import PasswordHasher, HashingPoolSaturated
+from usage_reset import reset_due_usage, start_usage_reset_scheduler
+from schema import ensure_schema
+from text_patch import apply_patch, content_hash, is_valid_text, PatchError
+from text_stats import TextStats, update_stats, reading_minutes, estimated_pages
+import search_index
+from compression import register_compression, coded_etags
+from json_stream import stream_json_list, stream_ndjson, iter_lines, sse_event
+from metrics import metrics
+from uploads import UploadRequest
+from audio_probe import probe_audio, check_audio_head, AudioProbeError, HEAD_SIZE
+from job_queue import JobQueue, PENDING, COMPLETED, FAILED, FINISHED
+from transcription import TRANSCRIBERS, transcribe_file
+from llm import OpenAIChat, FakeChat
+from interview_context import fit_context
+from single_flight import SingleFlight, DatabaseFlights, flight_key
+from timestamps import utcnow_naive
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, 
      origins=["*"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization"])
+     allow_headers=["Content-Type", "Authorization", "If-None-Match", "If-Match"],
+     expose_headers=["ETag"])
 
 # Add OPTIONS handler for preflight requests
 @app.before_request
@@ -31,17 +66,91 @@ def handle_preflight():
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///lifebooks.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///lifebooks.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50MB max file size
+app.config['UPLOAD_SPOOL_SIZE'] = int(os.environ.get('UPLOAD_SPOOL_SIZE', 1024 * 1024))  # bytes kept in memory per upload
+app.config['UPLOAD_INSPECT_SIZE'] = int(os.environ.get('UPLOAD_INSPECT_SIZE', HEAD_SIZE))  # bytes probed before the rest of an upload is read
+app.config['MAX_RECORDING_SECONDS'] = int(os.environ.get('MAX_RECORDING_SECONDS', 3 * 60 * 60))
+app.config['RECORDINGS_FOLDER'] = os.environ.get('RECORDINGS_FOLDER', os.path.join(app.instance_path, 'recordings'))
+app.config['TRANSCRIPTION_WORKERS'] = int(os.environ.get('TRANSCRIPTION_WORKERS', 2))  # per process, 0 = CLI worker only
+app.config['TRANSCRIPTION_LEASE'] = int(os.environ.get('TRANSCRIPTION_LEASE', 60))  # seconds
+app.config['TRANSCRIPTION_MAX_ATTEMPTS'] = int(os.environ.get('TRANSCRIPTION_MAX_ATTEMPTS', 3))
+app.config['TRANSCRIBER'] = os.environ.get('TRANSCRIBER', 'whisper')  # 'fake' transcribes offline, see transcription.py
+app.config['TRANSCRIBER_MAX_FILE_SIZE'] = int(os.environ.get('TRANSCRIBER_MAX_FILE_SIZE', 25 * 1024 * 1024))  # bytes per request, Whisper's limit
+app.config['TRANSCRIPTION_SEGMENT_SECONDS'] = int(os.environ.get('TRANSCRIPTION_SEGMENT_SECONDS', 300))
+app.config['TRANSCRIPTION_SAMPLE_RATE'] = int(os.environ.get('TRANSCRIPTION_SAMPLE_RATE', 16000))  # Hz WAV audio is sent at, 0 = as uploaded
+app.config['TRANSCRIPTION_SEGMENT_WORKERS'] = int(os.environ.get('TRANSCRIPTION_SEGMENT_WORKERS', 4))  # per process
+# Seconds GET /api/recordings/<id>?wait= may hold a request. Each held request
+# occupies a worker, so only raise this on threaded or async workers
+# (gunicorn --threads, gevent); with sync workers clients short-poll
+app.config['RECORDING_MAX_WAIT'] = float(os.environ.get('RECORDING_MAX_WAIT', 0))
+app.config['TRANSCRIPT_CACHE_DAYS'] = int(os.environ.get('TRANSCRIPT_CACHE_DAYS', 90))  # 0 disables the cache
+app.config['LLM_BACKEND'] = os.environ.get('LLM_BACKEND', 'openai')  # 'fake' answers offline, see llm.py
+app.config['LLM_MODEL'] = os.environ.get('LLM_MODEL', 'gpt-3.5-turbo')
+app.config['LLM_API_BASE'] = os.environ.get('LLM_API_BASE', 'https://api.openai.com/v1')
+app.config['LLM_TIMEOUT'] = float(os.environ.get('LLM_TIMEOUT', 60))  # seconds per call
+app.config['LLM_POOL_SIZE'] = int(os.environ.get('LLM_POOL_SIZE', 10))  # keep-alive connections
+app.config['LLM_FAKE_LATENCY'] = float(os.environ.get('LLM_FAKE_LATENCY', 0))  # seconds per fake call
+app.config['LLM_FAKE_TOKENS'] = int(os.environ.get('LLM_FAKE_TOKENS', 50))  # words per fake reply
+app.config['LLM_FAKE_SECONDS_PER_TOKEN'] = float(os.environ.get('LLM_FAKE_SECONDS_PER_TOKEN', 0))
+app.config['INTERVIEW_CONTEXT_TOKENS'] = int(os.environ.get('INTERVIEW_CONTEXT_TOKENS', 3000))  # prompt budget per interview reply
+app.config['INTERVIEW_SUMMARY_TOKENS'] = int(os.environ.get('INTERVIEW_SUMMARY_TOKENS', 400))  # running summary of older turns
+app.config['SINGLE_FLIGHT_SHARED'] = os.environ.get('SINGLE_FLIGHT_SHARED', 'true').lower() == 'true'  # coalesce across processes too
+app.config['SINGLE_FLIGHT_RESULT_TTL'] = int(os.environ.get('SINGLE_FLIGHT_RESULT_TTL', 10))  # seconds waiting processes have to read a result
+app.config['ENHANCE_CACHE_DAYS'] = int(os.environ.get('ENHANCE_CACHE_DAYS', 30))  # 0 disables the cache
+app.config['ENHANCE_CACHE_MAX_ENTRIES'] = int(os.environ.get('ENHANCE_CACHE_MAX_ENTRIES', 100000))  # stored, oldest dropped first
+app.config['ENHANCE_CACHE_MEMORY_SIZE'] = int(os.environ.get('ENHANCE_CACHE_MEMORY_SIZE', 1024))  # per process
+app.config['ENHANCE_CACHE_MEMORY_TTL'] = int(os.environ.get('ENHANCE_CACHE_MEMORY_TTL', 300))  # seconds a process may serve a replaced variant
+app.config['TOKEN_CACHE_SIZE'] = int(os.environ.get('TOKEN_CACHE_SIZE', 4096))
+app.config['TOKEN_CACHE_TTL'] = int(os.environ.get('TOKEN_CACHE_TTL', 300))  # seconds
+app.config['PASSWORD_HASH_ITERATIONS'] = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))
+app.config['REQUEST_THREADS'] = int(os.environ.get('REQUEST_THREADS', 1))  # request threads per process, as gunicorn --threads
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+# Hashes waiting for a worker; by default at most half the request threads hash or wait, the rest get 503s
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get(
+    'PASSWORD_HASH_QUEUE', max(app.config['REQUEST_THREADS'] // 2 - app.config['PASSWORD_HASH_WORKERS'], 0)
+))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+app.config['USAGE_RESET_INTERVAL'] = int(os.environ.get('USAGE_RESET_INTERVAL', 0))  # seconds, 0 = CLI only
+app.config['USAGE_RESET_CHUNK_SIZE'] = int(os.environ.get('USAGE_RESET_CHUNK_SIZE', 1000))
+app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+app.config['COMPRESSION_LEVEL'] = int(os.environ.get('COMPRESSION_LEVEL', 6))
 
 # Initialize database
 db = SQLAlchemy(app)
 
+# gzip (or brotli, if installed) for clients that accept it
+register_compression(app, min_size=app.config['COMPRESSION_MIN_SIZE'], level=app.config['COMPRESSION_LEVEL'])
+
+# Password hashing runs on a bounded pool; the request thread waits for it,
+# so the pool limits how many threads hashing can hold, see password_hashing.py
+password_hasher = PasswordHasher(
+    iterations=app.config['PASSWORD_HASH_ITERATIONS'],
+    max_workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_queue=app.config['PASSWORD_HASH_QUEUE'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+
 # API Keys
-openai.api_key = os.environ.get("OPENAI_API_KEY")
+openai.api_key = os.environ.get("OPENAI_API_KEY")  # Whisper, see transcription.py
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 
+# One chat completion client, and connection pool, for every AI endpoint
+if app.config['LLM_BACKEND'] == 'fake':
+    llm = FakeChat(
+        latency=app.config['LLM_FAKE_LATENCY'],
+        tokens=app.config['LLM_FAKE_TOKENS'],
+        seconds_per_token=app.config['LLM_FAKE_SECONDS_PER_TOKEN']
+    )
+else:
+    llm = OpenAIChat(
+        os.environ.get("OPENAI_API_KEY"),
+        api_base=app.config['LLM_API_BASE'],
+        timeout=app.config['LLM_TIMEOUT'],
+        pool_size=app.config['LLM_POOL_SIZE']
+    )
+
 # Subscription plans
 SUBSCRIPTION_PLANS = {
     'trial': {
@@ -62,6 +171,10 @@ SUBSCRIPTION_PLANS = {
     }
 }
 
+# Usage counters reset this long after usage_reset_date
+USAGE_WINDOW = datetime.timedelta(days=30)
+USAGE_FEATURES = ('ai_interviews', 'ai_enhancements', 'book_exports', 'voice_recordings')
+
 # Database Models
 class User(db.Model):
     __tablename__ = 'users'
@@ -82,7 +195,7 @@ class User(db.Model):
     monthly_ai_enhancements = db.Column(db.Integer, default=0)
     monthly_book_exports = db.Column(db.Integer, default=0)
     monthly_voice_recordings = db.Column(db.Integer, default=0)
-    usage_reset_date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    usage_reset_date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), index=True)
     
     # Metadata
     created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
@@ -90,47 +203,88 @@ class User(db.Model):
     last_login = db.Column(db.DateTime)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        # Upgrade hashes from an older scheme or cost; saved with the caller's commit
+        if password_hasher.needs_rehash(self.password_hash):
+            try:
+                self.set_password(password)
+            except HashingPoolSaturated:
+                pass
+        return True
     
-    def check_usage_limit(self, feature):
-        # Reset monthly usage if needed
-        now = datetime.datetime.now(datetime.timezone.utc)
-        
-        # Ensure usage_reset_date is timezone-aware
+    def usage_window_expired(self, now=None):
         if self.usage_reset_date is None:
-            self.usage_reset_date = now
-            db.session.commit()
-        elif self.usage_reset_date.tzinfo is None:
-            # Convert naive datetime to timezone-aware
-            self.usage_reset_date = self.usage_reset_date.replace(tzinfo=datetime.timezone.utc)
-            db.session.commit()
-        
-        if now >= self.usage_reset_date + datetime.timedelta(days=30):
-            self.monthly_ai_interviews = 0
-            self.monthly_ai_enhancements = 0
-            self.monthly_book_exports = 0
-            self.monthly_voice_recordings = 0
-            self.usage_reset_date = now
-            db.session.commit()
-        
+            return True
+        reset_date = self.usage_reset_date
+        if reset_date.tzinfo is not None:
+            reset_date = reset_date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return (now or utcnow_naive()) >= reset_date + USAGE_WINDOW
+    
+    def current_usage(self, feature):
+        if self.usage_window_expired():
+            return 0
+        return getattr(self, f'monthly_{feature}', 0) or 0
+    
+    def get_usage_limit(self, feature):
         plan = SUBSCRIPTION_PLANS.get(self.subscription_plan, SUBSCRIPTION_PLANS['trial'])
-        limit = plan.get(feature, 0)
+        return plan.get(feature, 0)
+    
+    def check_usage_limit(self, feature):
+        # Read-only: an expired window counts as zero until the reset job (or
+        # the next reservation) zeroes the stored counters
+        limit = self.get_usage_limit(feature)
         
         if limit == -1:  # unlimited
             return True, "Unlimited usage"
         
-        current_usage = getattr(self, f'monthly_{feature}', 0)
+        current_usage = self.current_usage(feature)
         if current_usage >= limit:
             return False, f"Monthly limit of {limit} {feature} reached. Upgrade to Pro for unlimited access."
         
         return True, f"Usage: {current_usage}/{limit}"
     
-    def increment_usage(self, feature):
-        current_value = getattr(self, f'monthly_{feature}', 0)
-        setattr(self, f'monthly_{feature}', current_value + 1)
+    def reserve_usage(self, feature):
+        """Check the plan limit and count one use in a single conditional UPDATE.
+
+        Window rollover, limit check and increment happen in the same statement,
+        so concurrent requests cannot overshoot the limit. Call release_usage if
+        the metered work fails afterwards.
+        """
+        limit = self.get_usage_limit(feature)
+        now = utcnow_naive()
+        window_expired = or_(User.usage_reset_date.is_(None), User.usage_reset_date <= now - USAGE_WINDOW)
+        counter = getattr(User, f'monthly_{feature}')
+        
+        values = {
+            getattr(User, f'monthly_{name}'): case((window_expired, 0), else_=getattr(User, f'monthly_{name}'))
+            for name in USAGE_FEATURES
+        }
+        values[counter] = case((window_expired, 1), else_=func.coalesce(counter, 0) + 1)
+        values[User.usage_reset_date] = case((window_expired, now), else_=User.usage_reset_date)
+        
+        statement = update(User).where(User.id == self.id)
+        if limit != -1:
+            statement = statement.where(or_(window_expired, func.coalesce(counter, 0) < limit))
+        result = db.session.execute(statement.values(values).execution_options(synchronize_session=False))
+        db.session.commit()
+        
+        if result.rowcount == 0:
+            return False, f"Monthly limit of {limit} {feature} reached. Upgrade to Pro for unlimited access."
+        return True, "Unlimited usage" if limit == -1 else f"Usage reserved ({limit} per month)"
+    
+    def release_usage(self, feature):
+        """Give back a unit taken by reserve_usage when the metered call failed"""
+        counter = getattr(User, f'monthly_{feature}')
+        db.session.execute(
+            update(User)
+            .where(User.id == self.id, counter > 0)
+            .values({counter: counter - 1})
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
     
     def to_dict(self):
@@ -148,8 +302,34 @@ class User(db.Model):
             }
         }
 
+# Serializable story fields, in response order (id is always included)
+STORY_FIELDS = ('title', 'content', 'summary', 'tags', 'word_count', 'character_count', 'reading_minutes', 'chapters',
+                'created_at', 'updated_at', 'last_auto_save', 'version', 'draft', 'draft_hash', 'draft_version')
+# Columns a serialized field is computed from, where they differ from its name
+STORY_FIELD_COLUMNS = {
+    'reading_minutes': ('word_count',),
+    'chapters': ('text_stats',),
+    'tags': (),
+    'draft': ('auto_save_content', 'content'),
+    'draft_hash': ('auto_save_content', 'auto_save_hash', 'content')
+}
+STORIES_PAGE_SIZE = 50
+STORIES_MAX_PAGE_SIZE = 100
+# Fields written per story by the library export and read back by the import
+STORY_EXPORT_FIELDS = ('title', 'content', 'summary', 'tags', 'auto_save_content', 'last_auto_save', 'created_at', 'updated_at')
+# Fields written per transcribed recording; the audio itself is not exported
+RECORDING_EXPORT_FIELDS = ('filename', 'file_size', 'duration', 'format', 'transcript', 'segments', 'transcript_confidence',
+                           'created_at', 'processed_at')
+IMPORT_BATCH_SIZE = 100  # stories per import transaction
+IMPORT_MAX_ERRORS = 1000  # line errors reported per import
+EXPORT_BATCH_SIZE = 100  # stories fetched per round trip by the export
+
 class Story(db.Model):
     __tablename__ = 'stories'
+    __table_args__ = (
+        # Backs the keyset pagination of GET /api/stories
+        db.Index('ix_stories_user_updated', 'user_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -157,52 +337,228 @@ class Story(db.Model):
     title = db.Column(db.String(500), nullable=False)
     content = db.Column(db.Text)
     summary = db.Column(db.Text)
-    tags = db.Column(db.Text)  # JSON string
+    tags = db.Column(db.Text)  # legacy JSON string, moved to story_tags by `flask migrate-story-tags`
     word_count = db.Column(db.Integer, default=0)
+    character_count = db.Column(db.Integer, default=0)
+    text_stats = db.Column(db.Text)  # JSON per-chapter counts, see text_stats.TextStats
     
     # Auto-save functionality
     auto_save_content = db.Column(db.Text)
+    auto_save_hash = db.Column(db.String(64))  # sha256 of auto_save_content
     last_auto_save = db.Column(db.DateTime)
     
+    # Bumped by the ORM on every UPDATE, so concurrent writers get
+    # StaleDataError; If-Match ETags name it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Bumped by each auto-save instead of version; auto-save patches name
+    # the draft version they were computed against
+    draft_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Metadata
     created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
     
+    tag_rows = db.relationship('StoryTag', order_by='StoryTag.position', cascade='all, delete-orphan')
+    
+    __mapper_args__ = {'version_id_col': version}
+    
     def update_word_count(self):
-        if self.content:
-            self.word_count = len(self.content.split())
-        else:
-            self.word_count = 0
+        self.apply_text_stats(TextStats.from_text(self.content))
+    
+    def set_content(self, content):
+        # Stats are updated from the changed span only, not by re-scanning the text
+        stats = update_stats(TextStats.from_json(self.text_stats), self.content, content)
+        self.content = content
+        self.apply_text_stats(stats)
+    
+    def apply_text_stats(self, stats):
+        self.word_count = stats.words
+        self.character_count = stats.characters
+        self.text_stats = stats.to_json()
+    
+    @property
+    def reading_minutes(self):
+        return reading_minutes(self.word_count)
+    
+    @property
+    def chapters(self):
+        stats = TextStats.from_json(self.text_stats)
+        return stats.chapter_list() if stats else []
+    
+    def auto_save_text(self):
+        # Base text for auto-save patches
+        if self.auto_save_content is not None:
+            return self.auto_save_content
+        return self.content or ''
+    
+    @property
+    def draft(self):
+        return self.auto_save_text()
+    
+    @property
+    def draft_hash(self):
+        # What auto-save patches send as base_hash
+        if self.auto_save_content is not None:
+            return self.auto_save_hash
+        return content_hash(self.content)
     
     def auto_save_content_func(self, content):
-        self.auto_save_content = content
-        self.last_auto_save = datetime.datetime.now(datetime.timezone.utc)
+        """Store an auto-save; returns False without writing if nothing changed.
+
+        The draft is written with one UPDATE conditional on ``draft_version``,
+        outside the ORM's versioning, so auto-saves leave ``version`` alone
+        and edits through PUT leave pending patches valid. Raises
+        StaleDataError if another auto-save got in first.
+        """
+        new_hash = content_hash(content)
+        if new_hash == self.auto_save_hash:
+            return False
+        values = {
+            'auto_save_content': content,
+            'auto_save_hash': new_hash,
+            'last_auto_save': utcnow_naive(),
+            'draft_version': self.draft_version + 1
+        }
+        result = db.session.execute(
+            update(Story)
+            .where(Story.id == self.id, Story.draft_version == self.draft_version)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
+        if result.rowcount == 0:
+            raise StaleDataError("Draft was auto-saved concurrently")
+        for key, value in values.items():
+            set_committed_value(self, key, value)
+        return True
     
     def get_tags_list(self):
-        if self.tags:
-            try:
-                return json.loads(self.tags)
-            except:
-                return []
-        return []
+        return [row.tag for row in self.tag_rows]
     
     def set_tags_list(self, tags_list):
-        self.tags = json.dumps(tags_list)
+        # Rows for kept tags are reused: the unit of work inserts before it
+        # deletes, so re-adding a removed tag would hit the primary key
+        existing = {row.tag: row for row in self.tag_rows}
+        self.tag_rows = [existing.get(tag) or StoryTag(tag=tag, user_id=self.user_id) for tag in normalize_tags(tags_list)]
+        for position, row in enumerate(self.tag_rows):
+            row.position = position
+    
+    def to_dict(self, fields=None):
+        # Only the requested fields are read, so columns left out of a
+        # load_only() query are never loaded
+        data = {'id': self.id}
+        for field in STORY_FIELDS if fields is None else fields:
+            if field == 'tags':
+                value = self.get_tags_list()
+            else:
+                value = getattr(self, field)
+                if isinstance(value, datetime.datetime):
+                    value = value.isoformat()
+            data[field] = value
+        return data
+
+def normalize_tags(tags_list):
+    # Trimmed, non-empty and unique, in the order given
+    return list(dict.fromkeys(tag for tag in (str(tag).strip()[:100] for tag in tags_list or []) if tag))
+
+class StoryTag(db.Model):
+    __tablename__ = 'story_tags'
+    __table_args__ = (
+        # Tag filters and per-user tag counts are answered from this index
+        db.Index('ix_story_tags_user_tag', 'user_id', 'tag', 'story_id'),
+    )
+    
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # copied from the story
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+class VoiceRecording(db.Model):
+    __tablename__ = 'voice_recordings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id'), nullable=True, index=True)
+    
+    # Recording details
+    filename = db.Column(db.String(500), nullable=False)
+    file_path = db.Column(db.String(1000))
+    file_size = db.Column(db.Integer)
+    duration = db.Column(db.Float)  # Duration in seconds
+    format = db.Column(db.String(10))  # mp3, wav, etc.
+    
+    # Transcription, run as a background job (see job_queue.JobQueue)
+    transcript = db.Column(db.Text)
+    transcript_segments = db.Column(db.Text)  # JSON [{start, end, text}], start/end in seconds
+    transcript_confidence = db.Column(db.Float)
+    content_hash = db.Column(db.String(64))  # sha256 of the audio, the transcript cache key
+    processing_status = db.Column(db.String(50), default=PENDING, index=True)  # pending, processing, completed, failed
+    error_message = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    started_at = db.Column(db.DateTime)  # claim time, renewed while processing
+    
+    # Metadata
+    created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    processed_at = db.Column(db.DateTime)
     
     def to_dict(self):
         return {
             'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'summary': self.summary,
-            'tags': self.get_tags_list(),
-            'word_count': self.word_count,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'last_auto_save': self.last_auto_save.isoformat() if self.last_auto_save else None
+            'story_id': self.story_id,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'duration': self.duration,
+            'format': self.format,
+            'transcript': self.transcript,
+            'segments': json.loads(self.transcript_segments) if self.transcript_segments else [],
+            'processing_status': self.processing_status,
+            'error': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
         }
 
+class TranscriptCacheEntry(db.Model):
+    """A finished transcript, reused for later uploads of the same audio"""
+    __tablename__ = 'transcript_cache'
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'model', 'format', name='uq_transcript_cache_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the audio
+    model = db.Column(db.String(100), nullable=False)  # transcriber and segmenting, see transcript_cache_model()
+    format = db.Column(db.String(10), nullable=False)
+    transcript = db.Column(db.Text)
+    transcript_segments = db.Column(db.Text)
+    duration = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=utcnow_naive, index=True)
+
+class EnhancementCacheEntry(db.Model):
+    """An /api/enhance-text result, reused for the same text, type, model and prompt"""
+    __tablename__ = 'enhancement_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False, unique=True)  # see enhancement_cache_key()
+    enhancement_type = db.Column(db.String(50))
+    model = db.Column(db.String(100))
+    enhanced_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow_naive, index=True)
+
+class InflightRequest(db.Model):
+    """An AI call in flight, or just finished, shared across processes (see single_flight.py)"""
+    __tablename__ = 'inflight_requests'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False, unique=True)  # see single_flight.flight_key
+    result = db.Column(db.Text)  # JSON, once finished
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+# Story title, content and summary, and recording transcripts, are kept in
+# the full-text index on write
+search_index.register_searchable(Story, 'story', title='title', body=('content', 'summary'))
+search_index.register_searchable(VoiceRecording, 'recording', title='filename', body=('transcript',))
+
 # Helper functions
 def generate_jwt_token(user_id):
     payload = {
@@ -211,6 +567,43 @@ def generate_jwt_token(user_id):
     }
     return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
 
+DEMO_TOKEN = 'demo-token'
+DEMO_EMAIL = 'demo@lifebooks.ai'
+
+# Verified token -> user id, so authenticated routes skip the JWT decode (and
+# the demo user's lookup by email). The cache is per process and invalidation
+# does not reach other workers, so only the id is cached and the user row is
+# still loaded by primary key on every request: plan, status and usage are
+# never served stale, and a user deleted by another worker gets 401.
+token_cache = TokenCache(max_size=app.config['TOKEN_CACHE_SIZE'], ttl=app.config['TOKEN_CACHE_TTL'])
+CACHED_USER_COLUMNS = ('id',)
+
+_demo_user_lock = threading.Lock()
+
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_tokens_on_delete(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
+
+def get_or_create_demo_user():
+    with _demo_user_lock:
+        demo_user = User.query.filter_by(email=DEMO_EMAIL).first()
+        if demo_user:
+            return demo_user
+        demo_user = User(
+            email=DEMO_EMAIL,
+            password_hash='demo_hash',
+            subscription_plan='pro',
+            subscription_status='active'
+        )
+        db.session.add(demo_user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker process created it first
+            db.session.rollback()
+            demo_user = User.query.filter_by(email=DEMO_EMAIL).first()
+        return demo_user
+
 def get_user_from_token(request):
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
@@ -218,32 +611,120 @@ def get_user_from_token(request):
     
     token = auth_header.split(' ')[1]
     
+    snapshot = token_cache.get(token)
+    if snapshot is not None:
+        user = db.session.get(User, snapshot['id'])
+        if user is None:
+            # Deleted, possibly by another process
+            token_cache.invalidate_user(snapshot['id'])
+        return user
+    
     # Allow demo access with specific demo token
-    if token == 'demo-token':
-        # Return demo user or create one if not exists
-        demo_user = User.query.filter_by(email='demo@lifebooks.ai').first()
-        if not demo_user:
-            demo_user = User(
-                email='demo@lifebooks.ai',
-                password_hash='demo_hash',
-                subscription_plan='pro',
-                subscription_status='active'
-            )
-            db.session.add(demo_user)
-            db.session.commit()
-        return demo_user
+    if token == DEMO_TOKEN:
+        user = get_or_create_demo_user()
+        expires_at = None
+    else:
+        try:
+            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+            user = User.query.get(payload['user_id'])
+            expires_at = payload.get('exp')
+        except:
+            return None
     
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        user = User.query.get(payload['user_id'])
-        return user
-    except:
+    if user is None:
         return None
+    
+    token_cache.set(token, user.id, {column: getattr(user, column) for column in CACHED_USER_COLUMNS}, expires_at=expires_at)
+    return user
+
+def server_busy_response():
+    response = jsonify({"message": "Server is busy, please try again shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def story_etag(story_id, version, draft_version):
+    return f"story-{story_id}-v{version}-d{draft_version}"
+
+def story_version_matches(etags, story):
+    # If-Match holds when the client's copy has the current content version;
+    # auto-saves of the draft since then are not a conflict
+    prefix = f"story-{story.id}-v{story.version}-d"
+    return etags.star_tag or any(tag.startswith(prefix) for tag in etags.as_set())
+
+def user_etag(user):
+    return f"user-{user.id}-{user.updated_at.timestamp() if user.updated_at else 0}"
+
+def etag_in(etags, etag):
+    # Compressed responses carry a per-encoding variant of the ETag
+    return any(etags.contains(tag) for tag in coded_etags(etag))
+
+def with_etag(response, etag, status=200):
+    """Attach a strong ETag to a JSON response, or answer 304 if the client has it"""
+    if etag_in(request.if_none_match, etag):
+        response = app.response_class(status=304)
+        status = 304
+    response.set_etag(etag)
+    return response, status
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    metrics.increment('uploads_rejected_too_large')
+    return jsonify({"message": f"Upload too large, the limit is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB"}), 413
+
+def wants_event_stream():
+    # AI endpoints stream tokens as Server-Sent Events when asked to
+    return request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream'
+
+def event_stream(events):
+    return app.response_class(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.errorhandler(AudioProbeError)
+def invalid_audio(e):
+    metrics.increment('uploads_rejected_invalid_audio')
+    return jsonify({"message": str(e)}), 422
 
 def allowed_audio_file(filename):
     ALLOWED_EXTENSIONS = {'mp3', 'wav', 'mp4', 'm4a', 'webm', 'flac'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+class RecordingTooLarge(Exception):
+    """Raised for a recording the transcriber can't take and we can't split"""
+
+@app.errorhandler(RecordingTooLarge)
+def recording_too_large(e):
+    metrics.increment('uploads_rejected_too_large')
+    return jsonify({"message": str(e)}), 413
+
+def check_recording_size(info, size):
+    # Only PCM WAV is cut into segments (see transcription.transcribe_file);
+    # anything else goes to the transcriber whole, so must fit in one request
+    if (info.format, info.codec) != ('wav', 'pcm') and size > app.config['TRANSCRIBER_MAX_FILE_SIZE']:
+        raise RecordingTooLarge(
+            f"{info.format} recordings are limited to {app.config['TRANSCRIBER_MAX_FILE_SIZE'] // (1024 * 1024)}MB, "
+            f"this one is {size / (1024 * 1024):.0f}MB. Upload it as WAV, or in shorter parts"
+        )
+
+def check_recording_length(info):
+    # Durations unknown from the headers are left to the transcriber
+    if info and info.duration and info.duration > app.config['MAX_RECORDING_SECONDS']:
+        raise AudioProbeError(
+            f"Recording is too long ({info.duration / 60:.0f} minutes), "
+            f"the limit is {app.config['MAX_RECORDING_SECONDS'] // 60} minutes"
+        )
+
+class AudioUploadRequest(UploadRequest):
+    def inspect_upload(self, filename, head):
+        # Audio that is invalid or too long is rejected from its first
+        # bytes, before the rest of the body is read
+        if filename and allowed_audio_file(filename):
+            check_recording_length(check_audio_head(head))
+
+app.request_class = AudioUploadRequest  # uploads are spooled once, see uploads.py
+
 # API Routes
 @app.route("/api/register", methods=["POST"])
 def register():
@@ -279,6 +760,9 @@ def register():
             "user": user.to_dict()
         }), 201
         
+    except HashingPoolSaturated:
+        db.session.rollback()
+        return server_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -297,8 +781,11 @@ def login():
     
     user = User.query.filter_by(email=email).first()
     
-    if not user or not user.check_password(password):
-        return jsonify({"message": "Invalid email or password"}), 401
+    try:
+        if not user or not user.check_password(password):
+            return jsonify({"message": "Invalid email or password"}), 401
+    except HashingPoolSaturated:
+        return server_busy_response()
     
     try:
         # Update last login
@@ -326,7 +813,545 @@ def get_profile():
     if not user:
         return jsonify({"message": "Authentication required"}), 401
     
-    return jsonify({"user": user.to_dict()}), 200
+    etag = user_etag(user)
+    if etag_in(request.if_none_match, etag):
+        return with_etag(None, etag)
+    return with_etag(jsonify({"user": user.to_dict()}), etag)
+
+# Story Management
+@app.route("/api/story", methods=["POST"])
+def create_story():
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    data = request.get_json()
+    title = data.get("title", "")
+    content = data.get("content", "")
+    
+    if not title:
+        return jsonify({"message": "Story title is required"}), 400
+
+    try:
+        story = Story(
+            user_id=user.id,
+            title=title,
+            content=content
+        )
+        story.update_word_count()
+        if data.get("tags"):
+            story.set_tags_list(data["tags"])
+        
+        db.session.add(story)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Story created successfully",
+            "story": story.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "message": "Story creation failed",
+            "error": str(e)
+        }), 500
+
+@app.route("/api/story/<int:story_id>", methods=["GET"])
+def get_story(story_id):
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    # Revalidation only reads the versions, never the story text
+    versions = db.session.query(Story.version, Story.draft_version).filter_by(id=story_id, user_id=user.id).first()
+    if versions is None:
+        return jsonify({"message": "Story not found"}), 404
+    etag = story_etag(story_id, *versions)
+    if etag_in(request.if_none_match, etag):
+        return with_etag(None, etag)
+
+    story = Story.query.filter_by(id=story_id, user_id=user.id).first()
+    if not story:
+        return jsonify({"message": "Story not found"}), 404
+
+    return with_etag(jsonify({"story": story.to_dict()}), story_etag(story.id, story.version, story.draft_version))
+
+@app.route("/api/story/<int:story_id>", methods=["PUT"])
+def update_story(story_id):
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    story = Story.query.filter_by(id=story_id, user_id=user.id).first()
+    if not story:
+        return jsonify({"message": "Story not found"}), 404
+
+    # If-Match makes the update conditional on the client's copy being current
+    if request.if_match and not story_version_matches(request.if_match, story):
+        response = jsonify({"message": "Story was modified", "version": story.version})
+        response.set_etag(story_etag(story.id, story.version, story.draft_version))
+        return response, 412
+
+    data = request.get_json()
+    
+    try:
+        if "title" in data:
+            story.title = data["title"]
+        if "content" in data:
+            story.set_content(data["content"])
+        if "summary" in data:
+            story.summary = data["summary"]
+        if "tags" in data:
+            story.set_tags_list(data["tags"])
+        
+        story.updated_at = datetime.datetime.now(datetime.timezone.utc)
+        db.session.commit()
+        
+        response = jsonify({
+            "message": "Story updated successfully",
+            "story": story.to_dict()
+        })
+        response.set_etag(story_etag(story.id, story.version, story.draft_version))
+        return response, 200
+        
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"message": "Story was modified"}), 412
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "message": "Story update failed",
+            "error": str(e)
+        }), 500
+
+@app.route("/api/story/<int:story_id>/auto-save", methods=["POST"])
+def auto_save_story(story_id):
+    """Auto-save a story draft.
+
+    Accepts either the full text as ``content`` or a ``patch`` (see
+    text_patch.apply_patch) computed against the story's ``draft``, with
+    that draft's ``draft_version`` as ``base_draft_version`` and its
+    ``draft_hash`` (sha256 of the UTF-8 text) as ``base_hash``. A patch whose
+    base doesn't match the stored draft gets 409 and the client should
+    resend the full content. Saves whose content hash is unchanged skip the
+    write. The draft is versioned apart from the story, so auto-saves don't
+    invalidate the ETag an editor sends with PUT.
+    """
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    # The draft text is only loaded if a patch has to be applied
+    story = (
+        Story.query
+        .options(load_only(Story.id, Story.version, Story.draft_version, Story.auto_save_hash, Story.last_auto_save))
+        .filter_by(id=story_id, user_id=user.id)
+        .first()
+    )
+    if not story:
+        return jsonify({"message": "Story not found"}), 404
+
+    data = request.get_json()
+    
+    if "patch" in data:
+        if not data.get("base_hash"):
+            return jsonify({"message": "Invalid patch", "error": "base_hash is required"}), 400
+        if data.get("base_draft_version") != story.draft_version:
+            return jsonify({"message": "Version conflict", "draft_version": story.draft_version}), 409
+        base = story.auto_save_text()
+        if data["base_hash"] != content_hash(base):
+            return jsonify({"message": "Patch base does not match the draft", "draft_version": story.draft_version}), 409
+        try:
+            content = apply_patch(base, data["patch"])
+        except PatchError as e:
+            return jsonify({"message": "Invalid patch", "error": str(e)}), 400
+    else:
+        content = data.get("content", "")
+        if not is_valid_text(content):
+            return jsonify({"message": "content must be text without unpaired surrogates"}), 400
+    
+    try:
+        changed = story.auto_save_content_func(content)
+        
+        return jsonify({
+            "message": "Auto-save successful" if changed else "No changes to save",
+            "changed": changed,
+            "version": story.version,
+            "draft_version": story.draft_version,
+            "last_auto_save": story.last_auto_save.isoformat() if story.last_auto_save else None
+        }), 200
+        
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"message": "Version conflict", "draft_version": Story.query.get(story_id).draft_version}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "message": "Auto-save failed",
+            "error": str(e)
+        }), 500
+
+def encode_stories_cursor(story):
+    raw = f"{story.updated_at.isoformat()}|{story.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_stories_cursor(cursor):
+    updated_at, story_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.datetime.fromisoformat(updated_at), int(story_id)
+
+@app.route("/api/stories", methods=["GET"])
+def get_user_stories():
+    """List a user's stories, most recently updated first.
+
+    Keyset-paginated on (updated_at, id): pass the returned ``next_cursor``
+    as ``cursor`` to get the next page of ``limit`` stories. ``fields``
+    (comma-separated, e.g. ``title,word_count,updated_at``) restricts the
+    serialized fields; only the matching columns are loaded, so list views
+    never read story bodies. ``tag`` limits the list to stories with that tag.
+    """
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    fields = STORY_FIELDS
+    if request.args.get("fields"):
+        fields = tuple(field.strip() for field in request.args["fields"].split(",") if field.strip() and field.strip() != "id")
+        unknown = [field for field in fields if field not in STORY_FIELDS]
+        if unknown:
+            return jsonify({"message": f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    limit = min(max(request.args.get("limit", STORIES_PAGE_SIZE, type=int), 1), STORIES_MAX_PAGE_SIZE)
+    
+    # Only stories with the tag are read, found through ix_story_tags_user_tag
+    stories_query = Story.query.filter(Story.user_id == user.id)
+    tag = request.args.get("tag")
+    if tag:
+        stories_query = stories_query.join(StoryTag, StoryTag.story_id == Story.id).filter(
+            StoryTag.user_id == user.id, StoryTag.tag == tag
+        )
+    
+    # Any insert, update, auto-save or delete changes the count, the latest
+    # updated_at or a version, so the list ETag comes from one aggregate over
+    # small columns
+    story_count, last_updated, version_sum, draft_version_sum = stories_query.with_entities(
+        func.count(Story.id),
+        func.max(Story.updated_at),
+        func.coalesce(func.sum(Story.version), 0),
+        func.coalesce(func.sum(Story.draft_version), 0)
+    ).one()
+    etag = hashlib.sha1(
+        f"{user.id}|{story_count}|{last_updated}|{version_sum}|{draft_version_sum}|{request.query_string.decode()}".encode()
+    ).hexdigest()
+    if etag_in(request.if_none_match, etag):
+        return with_etag(None, etag)
+    
+    columns = {'id', 'updated_at'}
+    for field in fields:
+        columns.update(STORY_FIELD_COLUMNS.get(field, (field,)))
+    query = (
+        stories_query
+        .options(load_only(*[getattr(Story, column) for column in columns]))
+        .order_by(Story.updated_at.desc(), Story.id.desc())
+    )
+    if "tags" in fields:
+        query = query.options(selectinload(Story.tag_rows))
+    
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            updated_at, story_id = decode_stories_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"message": "Invalid cursor"}), 400
+        query = query.filter(or_(
+            Story.updated_at < updated_at,
+            and_(Story.updated_at == updated_at, Story.id < story_id)
+        ))
+    
+    # Stories are serialized as they come off the cursor; the extra row only
+    # tells whether there is a next page
+    page = {"last": None, "more": False}
+    
+    def page_items():
+        for index, story in enumerate(query.limit(limit + 1).yield_per(STORIES_PAGE_SIZE)):
+            if index == limit:
+                page["more"] = True
+                break
+            page["last"] = story
+            yield story.to_dict(fields)
+    
+    def trailer():
+        return {"next_cursor": encode_stories_cursor(page["last"]) if page["more"] else None}
+    
+    response = app.response_class(
+        stream_with_context(stream_json_list("stories", page_items(), trailer)),
+        mimetype="application/json"
+    )
+    return with_etag(response, etag)
+
+@app.route("/api/tags", methods=["GET"])
+def get_user_tags():
+    # Per-tag story counts, aggregated from ix_story_tags_user_tag alone
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    rows = (
+        db.session.query(StoryTag.tag, func.count(StoryTag.story_id))
+        .filter(StoryTag.user_id == user.id)
+        .group_by(StoryTag.tag)
+        .order_by(func.count(StoryTag.story_id).desc(), StoryTag.tag)
+        .all()
+    )
+    return jsonify({"tags": [{"tag": tag, "count": count} for tag, count in rows]}), 200
+
+@app.route("/api/stories/stats", methods=["GET"])
+def get_user_story_stats():
+    # Book-length estimate across all stories, from the stored counts in one query
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    story_count, word_count, character_count = db.session.query(
+        func.count(Story.id),
+        func.coalesce(func.sum(Story.word_count), 0),
+        func.coalesce(func.sum(Story.character_count), 0)
+    ).filter(Story.user_id == user.id).one()
+    
+    return jsonify({
+        "story_count": story_count,
+        "word_count": word_count,
+        "character_count": character_count,
+        "reading_minutes": reading_minutes(word_count),
+        "estimated_pages": estimated_pages(word_count)
+    }), 200
+
+def story_export_record(story):
+    # The id only links recordings to their story within the export
+    record = {"type": "story", "id": story.id}
+    for field in STORY_EXPORT_FIELDS:
+        value = story.get_tags_list() if field == "tags" else getattr(story, field)
+        record[field] = value.isoformat() if isinstance(value, datetime.datetime) else value
+    return record
+
+def story_from_import(record, user_id):
+    """Build a Story from an export record; raises ValueError if the record is invalid"""
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    if record.get("type", "story") != "story":
+        raise ValueError(f"Unsupported record type: {record.get('type')}")
+    if not isinstance(record.get("title"), str) or not record["title"].strip():
+        raise ValueError("Story title is required")
+    if record.get("id") is not None and not isinstance(record["id"], int):
+        raise ValueError("id must be an integer")
+    for field in ("content", "summary", "auto_save_content"):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise ValueError(f"{field} must be a string")
+    if record.get("tags") is not None and not isinstance(record["tags"], list):
+        raise ValueError("tags must be a list")
+
+    story = Story(user_id=user_id, title=record["title"][:500], content=record.get("content") or "", summary=record.get("summary"))
+    story.update_word_count()
+    story.set_tags_list(record.get("tags"))
+    if record.get("auto_save_content") is not None:
+        story.auto_save_content = record["auto_save_content"]
+        story.auto_save_hash = content_hash(record["auto_save_content"])
+    for field in ("last_auto_save", "created_at", "updated_at"):
+        if record.get(field):
+            try:
+                setattr(story, field, datetime.datetime.fromisoformat(record[field]))
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be an ISO 8601 date")
+    return story
+
+def recording_export_record(recording):
+    record = {"type": "recording", "story_id": recording.story_id}
+    for field in RECORDING_EXPORT_FIELDS:
+        if field == "segments":
+            value = json.loads(recording.transcript_segments) if recording.transcript_segments else []
+        else:
+            value = getattr(recording, field)
+        record[field] = value.isoformat() if isinstance(value, datetime.datetime) else value
+    return record
+
+def recording_from_import(record, user_id, story_ids):
+    """Build a completed VoiceRecording from an export record; raises ValueError if the record is invalid.
+
+    ``story_ids`` maps the story ids of the export to the imported stories.
+    """
+    if not isinstance(record.get("filename"), str) or not record["filename"].strip():
+        raise ValueError("Recording filename is required")
+    if not isinstance(record.get("transcript"), str):
+        raise ValueError("Recording transcript must be a string")
+    if record.get("story_id") is not None and not isinstance(record["story_id"], int):
+        raise ValueError("story_id must be an integer")
+    if record.get("segments") is not None and not isinstance(record["segments"], list):
+        raise ValueError("segments must be a list")
+    for field in ("file_size", "duration", "transcript_confidence"):
+        if record.get(field) is not None and (not isinstance(record[field], (int, float)) or isinstance(record[field], bool)):
+            raise ValueError(f"{field} must be a number")
+
+    recording = VoiceRecording(
+        user_id=user_id,
+        story_id=story_ids.get(record.get("story_id")),
+        filename=record["filename"][:500],
+        file_size=record.get("file_size"),
+        duration=record.get("duration"),
+        format=str(record["format"])[:10] if record.get("format") else None,
+        transcript=record["transcript"],
+        transcript_segments=json.dumps(record["segments"]) if record.get("segments") else None,
+        transcript_confidence=record.get("transcript_confidence"),
+        processing_status=COMPLETED
+    )
+    for field in ("created_at", "processed_at"):
+        if record.get(field):
+            try:
+                setattr(recording, field, datetime.datetime.fromisoformat(record[field]))
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be an ISO 8601 date")
+    return recording
+
+def record_from_import(record, user_id, story_ids):
+    # A Story or VoiceRecording for one line of an export
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    if record.get("type") == "recording":
+        return recording_from_import(record, user_id, story_ids)
+    return story_from_import(record, user_id)
+
+@app.route("/api/stories/import", methods=["POST"])
+def import_stories():
+    """Import stories and recording transcripts from NDJSON, one export record per line.
+
+    Lines are read straight from the request stream and inserted in
+    transactions of IMPORT_BATCH_SIZE records, so memory stays flat however
+    large the upload is. Invalid lines are reported by line number and
+    don't stop the import. Recordings are linked to the imported story
+    their ``story_id`` names, if it came earlier in the file.
+    """
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    user_id = user.id
+    result = {"imported": 0, "failed": 0, "errors": []}
+    batch = []
+    story_ids = {}  # export story id -> imported story id
+
+    def report(number, message):
+        result["failed"] += 1
+        if len(result["errors"]) < IMPORT_MAX_ERRORS:
+            result["errors"].append({"line": number, "error": message})
+
+    def imported(record, item_id):
+        result["imported"] += 1
+        if record.get("type", "story") == "story" and record.get("id") is not None:
+            story_ids[record["id"]] = item_id
+
+    def save_batch():
+        db.session.add_all(item for _number, _record, item in batch)
+        try:
+            db.session.flush()
+            saved = [(record, item.id) for _number, record, item in batch]
+            db.session.commit()
+            for record, item_id in saved:
+                imported(record, item_id)
+        except Exception:
+            # Retry line by line to find the ones that failed
+            db.session.rollback()
+            for number, record, _item in batch:
+                try:
+                    item = record_from_import(record, user_id, story_ids)
+                    db.session.add(item)
+                    db.session.flush()
+                    item_id = item.id
+                    db.session.commit()
+                    imported(record, item_id)
+                except Exception as e:
+                    db.session.rollback()
+                    report(number, str(e))
+        batch.clear()
+
+    def pending_story(record):
+        # A recording whose story is in the unsaved batch
+        return record.get("type") == "recording" and record.get("story_id") is not None and any(
+            isinstance(item, Story) and queued.get("id") == record["story_id"] for _number, queued, item in batch
+        )
+
+    for number, line in enumerate(iter_lines(request.stream), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, dict) and pending_story(record):
+                save_batch()
+            batch.append((number, record, record_from_import(record, user_id, story_ids)))
+        except ValueError as e:  # includes invalid JSON and UTF-8
+            report(number, str(e))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            save_batch()
+    if batch:
+        save_batch()
+
+    result["errors_truncated"] = result["failed"] > len(result["errors"])
+    return jsonify(result), 200
+
+@app.route("/api/stories/export", methods=["GET"])
+def export_stories():
+    """Stream the user's stories, drafts included, and then their recording
+    transcripts as NDJSON in import format.
+
+    Rows are read from a server-side cursor EXPORT_BATCH_SIZE at a time and
+    written out as they arrive, so memory doesn't grow with the library.
+    Only transcribed recordings are exported, without their audio.
+    """
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    query = (
+        Story.query
+        .options(selectinload(Story.tag_rows))
+        .filter(Story.user_id == user.id)
+        .order_by(Story.id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    recordings = (
+        VoiceRecording.query
+        .filter(VoiceRecording.user_id == user.id, VoiceRecording.processing_status == COMPLETED)
+        .order_by(VoiceRecording.id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    records = itertools.chain(
+        (story_export_record(story) for story in query),
+        (recording_export_record(recording) for recording in recordings)
+    )
+
+    response = app.response_class(stream_with_context(stream_ndjson(records)), mimetype="application/x-ndjson")
+    response.headers["Content-Disposition"] = 'attachment; filename="lifebooks-export.ndjson"'
+    return response
+
+@app.route("/api/search", methods=["GET"])
+def search_library():
+    """Ranked full-text search over the user's stories and recording transcripts"""
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"message": "Search query is required"}), 400
+    
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    
+    results = search_index.search(db.session.connection(), user.id, query, limit=limit + 1, offset=offset)
+    
+    return jsonify({
+        "results": results[:limit],
+        "next_offset": offset + limit if len(results) > limit else None
+    }), 200
 
 # Simple demo endpoints for testing
 @app.route("/api/demo/interview", methods=["POST"])
@@ -388,6 +1413,24 @@ def demo_pdf():
 def health_check():
     return jsonify({"status": "healthy", "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()}), 200
 
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    # Process-local counters; each worker process reports its own
+    snapshot = metrics.snapshot()
+    lookups = snapshot.get('transcript_cache_hits', 0) + snapshot.get('transcript_cache_misses', 0)
+    streams = snapshot.get('llm_streams', 0)
+    enhance_hits = snapshot.get('enhance_cache_memory_hits', 0) + snapshot.get('enhance_cache_disk_hits', 0)
+    enhance_lookups = enhance_hits + snapshot.get('enhance_cache_misses', 0)
+    return jsonify({
+        "metrics": snapshot,
+        "transcript_cache_hit_rate": round(snapshot.get('transcript_cache_hits', 0) / lookups, 4) if lookups else None,
+        "enhance_cache_hit_rate": round(enhance_hits / enhance_lookups, 4) if enhance_lookups else None,
+        "llm_mean_first_token_ms": round(snapshot.get('llm_first_token_milliseconds', 0) / streams) if streams else None,
+        "ai_calls_saved": snapshot.get('single_flight_saved_calls', 0),
+        "upload_spool_size": app.config['UPLOAD_SPOOL_SIZE'],
+        "max_content_length": app.config['MAX_CONTENT_LENGTH']
+    }), 200
+
 # Simple test endpoint
 @app.route("/api/test", methods=["GET", "POST"])
 def test_endpoint():
@@ -397,14 +1440,95 @@ def test_endpoint():
         "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
     }), 200
 
+# Monthly usage reset: a batch job resets every due user with set-based
+# UPDATEs so request handlers only read the counters
+def reset_monthly_usage(chunk_size=None):
+    now = utcnow_naive()
+    return reset_due_usage(
+        db.session,
+        User,
+        [getattr(User, f'monthly_{feature}') for feature in USAGE_FEATURES],
+        User.usage_reset_date,
+        cutoff=now - USAGE_WINDOW,
+        reset_to=now,
+        chunk_size=chunk_size or app.config['USAGE_RESET_CHUNK_SIZE']
+    )
+
+@app.cli.command("reset-usage")
+@click.option("--chunk-size", type=int, default=None, help="Users updated per transaction")
+def reset_usage_command(chunk_size):
+    """Reset monthly usage counters of every user whose window has ended"""
+    result = reset_monthly_usage(chunk_size)
+    click.echo(f"Reset usage for {result.rows} users in {result.seconds:.3f}s")
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Re-index every story and transcript, e.g. after enabling search on an existing database"""
+    connection = db.session.connection()
+    count = 0
+    for story in Story.query.options(load_only(Story.id, Story.user_id, Story.title, Story.content, Story.summary)).yield_per(500):
+        search_index.index_document(connection, 'story', story.id, story.user_id, story.title,
+                                    '\n\n'.join(part or '' for part in (story.content, story.summary)))
+        count += 1
+    for recording in VoiceRecording.query.options(load_only(VoiceRecording.id, VoiceRecording.user_id, VoiceRecording.filename, VoiceRecording.transcript)).yield_per(500):
+        search_index.index_document(connection, 'recording', recording.id, recording.user_id, recording.filename, recording.transcript)
+        count += 1
+    db.session.commit()
+    click.echo(f"Indexed {count} documents")
+
+def migrate_story_tags(chunk_size=500):
+    """Move tags still stored as a JSON string on the story into story_tags.
+
+    Stories keep their updated_at and version, so list order and ETags
+    don't change. Returns the number of stories migrated.
+    """
+    migrated = 0
+    while True:
+        rows = db.session.query(Story.id, Story.user_id, Story.tags).filter(Story.tags.isnot(None)).limit(chunk_size).all()
+        if not rows:
+            return migrated
+        for story_id, user_id, raw in rows:
+            try:
+                tags = json.loads(raw)
+            except ValueError:
+                tags = []
+            db.session.add_all(
+                StoryTag(story_id=story_id, user_id=user_id, tag=tag, position=position)
+                for position, tag in enumerate(normalize_tags(tags if isinstance(tags, list) else []))
+            )
+        db.session.execute(
+            update(Story)
+            .where(Story.id.in_([row.id for row in rows]))
+            .values(tags=None, updated_at=Story.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        migrated += len(rows)
+
+# One-off, run once after deploying tag storage rather than from every worker
+@app.cli.command("migrate-story-tags")
+@click.option("--chunk-size", type=int, default=500, help="Stories migrated per transaction")
+def migrate_story_tags_command(chunk_size):
+    """Move legacy JSON tags into the story_tags table"""
+    migrated = migrate_story_tags(chunk_size)
+    click.echo(f"Migrated tags of {migrated} stories")
+
 # Initialize database tables
 def init_db():
     with app.app_context():
         db.create_all()
+        ensure_schema(db)
+        with db.engine.begin() as connection:
+            search_index.create_search_index(connection)
 
 # Initialize database on import
 init_db()
 
+# Optional in-process scheduler; each worker runs it, which is safe because
+# the reset only touches rows that are still due
+if app.config['USAGE_RESET_INTERVAL'] > 0:
+    start_usage_reset_scheduler(app, reset_monthly_usage, app.config['USAGE_RESET_INTERVAL'])
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
 
@@ -417,11 +1541,11 @@ def transcribe_audio():
     if not user:
         return jsonify({"message": "Authentication required"}), 401
     
-    # Skip usage limits for demo users to avoid datetime issues
-    if user.email != 'demo@lifebooks.ai':
-        # Check usage limits for regular users
-        can_use, message = user.check_usage_limit('voice_recordings')
-        if not can_use:
+    # Users at their limit are turned away before the upload is read; the
+    # unit itself is reserved once the cache has been checked
+    if user.email != DEMO_EMAIL:
+        allowed, message = user.check_usage_limit('voice_recordings')
+        if not allowed:
             return jsonify({"message": message}), 429
     
     # Check if audio file is present
@@ -435,42 +1559,283 @@ def transcribe_audio():
     if not allowed_audio_file(audio_file.filename):
         return jsonify({"message": "Invalid audio file format. Supported formats: mp3, wav, mp4, m4a, webm, flac"}), 400
     
+    filename = secure_filename(audio_file.filename) or 'recording'
+    
+    # Read from the container headers only. The format is what the content
+    # is, not what it was named: browsers record webm whatever the name
     try:
-        # Create a temporary file to save the audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            audio_file.save(temp_file.name)
-            
-            # Use OpenAI Whisper API for transcription
-            with open(temp_file.name, 'rb') as audio_data:
-                transcript = openai.Audio.transcribe(
-                    model="whisper-1",
-                    file=audio_data,
-                    response_format="text"
-                )
-            
-            # Clean up temporary file
-            os.unlink(temp_file.name)
-            
-            # Increment usage counter
-            user.increment_usage('voice_recordings')
-            
-            return jsonify({
-                "message": "Transcription successful",
-                "transcription": transcript,
-                "usage": f"Voice recordings used: {user.monthly_voice_recordings}"
-            }), 200
+        info = probe_audio(audio_file.stream, audio_file.stream.size)
+        check_recording_length(info)
+        check_recording_size(info, audio_file.stream.size)
+    except (AudioProbeError, RecordingTooLarge):
+        audio_file.close()
+        raise
+    extension = info.format
+    
+    # The upload was hashed as it streamed in; audio transcribed before is
+    # served from the cache, and not billed
+    audio_hash = audio_file.stream.content_hash()
+    cached = cached_transcript(audio_hash, extension)
+    if cached:
+        metrics.increment('transcript_cache_hits')
+    else:
+        metrics.increment('transcript_cache_misses')
+    
+    # Demo users are not metered
+    metered = user.email != DEMO_EMAIL and cached is None
+    if metered:
+        # Reserve a unit up front; released if transcription fails
+        reserved, message = user.reserve_usage('voice_recordings')
+        if not reserved:
+            return jsonify({"message": message}), 429
+    
+    # Cached audio is never transcribed, so it is not kept
+    file_path = None if cached else os.path.join(app.config['RECORDINGS_FOLDER'], f"{secrets.token_hex(16)}.{extension}")
+    try:
+        if file_path:
+            # The upload was written once, into its spooled buffer, while the
+            # form was parsed; it is kept on disk until the job has run
+            os.makedirs(app.config['RECORDINGS_FOLDER'], exist_ok=True)
+            audio_file.stream.seek(0)
+            with open(file_path, 'wb') as destination:
+                shutil.copyfileobj(audio_file.stream, destination, 1024 * 1024)
+        
+        recording = VoiceRecording(
+            user_id=user.id,
+            filename=filename,
+            file_path=file_path,
+            file_size=audio_file.stream.size,
+            duration=info.duration,
+            format=extension,
+            content_hash=audio_hash
+        )
+        if cached:
+            apply_cached_transcript(recording, cached)
+        db.session.add(recording)
+        db.session.commit()
             
     except Exception as e:
-        # Clean up temporary file if it exists
-        try:
-            os.unlink(temp_file.name)
-        except:
-            pass
+        db.session.rollback()
+        if file_path and os.path.exists(file_path):
+            os.unlink(file_path)
+        if metered:
+            user.release_usage('voice_recordings')
             
         return jsonify({
             "message": "Transcription failed",
             "error": str(e)
         }), 500
+    finally:
+        # Frees the buffer and removes any disk spill
+        audio_file.close()
+    
+    if not cached:
+        transcription_queue.notify()
+    
+    status_url = f"/api/recordings/{recording.id}"
+    response = jsonify({
+        "message": "Transcription served from cache" if cached else "Transcription queued",
+        "recording": recording.to_dict(),
+        "status_url": status_url,
+        "usage": f"Voice recordings used: {user.monthly_voice_recordings}"
+    })
+    response.headers['Location'] = status_url
+    return response, 200 if cached else 202
+
+transcriber = TRANSCRIBERS[app.config['TRANSCRIBER']]()
+# Segments of long recordings, from every job in this process, share one
+# bounded pool
+segment_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=app.config['TRANSCRIPTION_SEGMENT_WORKERS'],
+    thread_name_prefix='transcribe-segment'
+)
+
+def transcript_cache_model():
+    # Segment length and sample rate are part of the key: they change the
+    # audio the transcriber hears
+    model = f"{transcriber.model}/{app.config['TRANSCRIPTION_SEGMENT_SECONDS']}s"
+    if app.config['TRANSCRIPTION_SAMPLE_RATE']:
+        model += f"/{app.config['TRANSCRIPTION_SAMPLE_RATE']}hz"
+    return model
+
+def cached_transcript(content_hash, audio_format):
+    """The cache entry for this audio, or None if there is none within retention"""
+    if not app.config['TRANSCRIPT_CACHE_DAYS'] or not content_hash:
+        return None
+    return (
+        TranscriptCacheEntry.query
+        .filter_by(content_hash=content_hash, model=transcript_cache_model(), format=audio_format)
+        .filter(TranscriptCacheEntry.created_at >= utcnow_naive() - datetime.timedelta(days=app.config['TRANSCRIPT_CACHE_DAYS']))
+        .first()
+    )
+
+def apply_cached_transcript(recording, entry):
+    recording.transcript = entry.transcript
+    recording.transcript_segments = entry.transcript_segments
+    if entry.duration is not None:
+        recording.duration = entry.duration
+    recording.processing_status = COMPLETED
+    recording.processed_at = datetime.datetime.now(datetime.timezone.utc)
+
+def cache_transcript(recording):
+    if not app.config['TRANSCRIPT_CACHE_DAYS'] or not recording.content_hash:
+        return
+    key = {'content_hash': recording.content_hash, 'model': transcript_cache_model(), 'format': recording.format}
+    # An expired entry for the same key is refreshed in place
+    entry = TranscriptCacheEntry.query.filter_by(**key).first() or TranscriptCacheEntry(**key)
+    entry.transcript = recording.transcript
+    entry.transcript_segments = recording.transcript_segments
+    entry.duration = recording.duration
+    entry.created_at = utcnow_naive()
+    db.session.add(entry)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker cached the same audio first
+        db.session.rollback()
+
+def transcribe_recording(recording_id):
+    # Job handler: runs on a transcription worker, see transcription_queue
+    recording = db.session.get(VoiceRecording, recording_id)
+    
+    # The same audio may have been transcribed since this one was queued
+    cached = cached_transcript(recording.content_hash, recording.format)
+    if cached:
+        metrics.increment('transcript_cache_late_hits')
+        apply_cached_transcript(recording, cached)
+        finish_recording(recording)
+        release_recording_usage(recording)
+        return
+    
+    try:
+        transcript, segments, duration = transcribe_file(
+            recording.file_path,
+            transcriber,
+            segment_executor,
+            segment_seconds=app.config['TRANSCRIPTION_SEGMENT_SECONDS'],
+            sample_rate=app.config['TRANSCRIPTION_SAMPLE_RATE'] or None
+        )
+    except Exception as e:
+        print(f"Transcription error: {str(e)}")
+        fail_recording(recording, str(e))
+        return
+    
+    recording.transcript = transcript
+    recording.transcript_segments = json.dumps(segments)
+    if duration is not None:
+        recording.duration = duration
+    recording.processing_status = COMPLETED
+    recording.processed_at = datetime.datetime.now(datetime.timezone.utc)
+    finish_recording(recording)
+    cache_transcript(recording)
+
+def fail_recording(recording, message):
+    recording.processing_status = FAILED
+    recording.error_message = message
+    recording.processed_at = datetime.datetime.now(datetime.timezone.utc)
+    finish_recording(recording)
+    release_recording_usage(recording)
+
+def finish_recording(recording):
+    """Commit a finished job and delete its audio, which is no longer needed"""
+    file_path = recording.file_path
+    recording.file_path = None
+    db.session.commit()
+    # Removed only once committed, so a job that is retried still has it
+    if file_path:
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+
+def release_recording_usage(recording):
+    # Give back the unit reserved at upload
+    user = db.session.get(User, recording.user_id)
+    if user and user.email != DEMO_EMAIL:
+        user.release_usage('voice_recordings')
+
+def give_up_recording(recording_id):
+    fail_recording(db.session.get(VoiceRecording, recording_id), "Transcription did not finish after repeated attempts")
+
+# Transcription jobs are rows of voice_recordings, worked by threads in
+# every process (and by `flask transcription-worker`)
+transcription_queue = JobQueue(
+    app, db, VoiceRecording,
+    handler=transcribe_recording,
+    give_up=give_up_recording,
+    workers=app.config['TRANSCRIPTION_WORKERS'],
+    lease=app.config['TRANSCRIPTION_LEASE'],
+    max_attempts=app.config['TRANSCRIPTION_MAX_ATTEMPTS']
+)
+if app.config['TRANSCRIPTION_WORKERS'] > 0:
+    transcription_queue.start()
+
+@app.route("/api/recordings/<int:recording_id>", methods=["GET"])
+def get_recording(recording_id):
+    """Transcription status of a recording, with the transcript once completed.
+
+    ``wait`` (seconds, up to the RECORDING_MAX_WAIT setting) long-polls:
+    the response is held until the job has finished or the time is up. The
+    setting is 0 by default, so every request answers at once and clients
+    poll with backoff instead.
+    """
+    user = get_user_from_token(request)
+    if not user:
+        return jsonify({"message": "Authentication required"}), 401
+
+    user_id = user.id
+    deadline = time.monotonic() + min(max(request.args.get("wait", 0, type=float), 0), app.config['RECORDING_MAX_WAIT'])
+    while True:
+        recording = VoiceRecording.query.filter_by(id=recording_id, user_id=user_id).first()
+        if not recording:
+            return jsonify({"message": "Recording not found"}), 404
+        remaining = deadline - time.monotonic()
+        if recording.processing_status in FINISHED or remaining <= 0:
+            return jsonify({"recording": recording.to_dict()}), 200
+        # Give the connection back while waiting; re-read after any job
+        # finishes here, or every second for jobs run by other processes
+        db.session.rollback()
+        transcription_queue.wait_for_finished(min(remaining, 1.0))
+
+@app.cli.command("prune-transcript-cache")
+def prune_transcript_cache_command():
+    """Delete cached transcripts older than TRANSCRIPT_CACHE_DAYS"""
+    cutoff = utcnow_naive() - datetime.timedelta(days=app.config['TRANSCRIPT_CACHE_DAYS'])
+    deleted = TranscriptCacheEntry.query.filter(TranscriptCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f"Deleted {deleted} cached transcripts")
+
+@app.cli.command("prune-enhancement-cache")
+def prune_enhancement_cache_command():
+    """Delete cached text enhancements older than ENHANCE_CACHE_DAYS"""
+    cutoff = utcnow_naive() - datetime.timedelta(days=app.config['ENHANCE_CACHE_DAYS'])
+    deleted = EnhancementCacheEntry.query.filter(EnhancementCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f"Deleted {deleted} cached text enhancements")
+
+@app.cli.command("transcription-worker")
+def transcription_worker_command():
+    """Process transcription jobs in the foreground"""
+    click.echo("Transcription worker started")
+    while True:
+        if not transcription_queue.run_once():
+            time.sleep(transcription_queue.poll_interval)
+
+# Identical AI requests in flight at the same time (double clicks, client
+# retries) share one upstream call, across processes through the database.
+# Failures are raised, not returned, so they are never shared with a retry.
+ai_flights = SingleFlight(
+    shared=DatabaseFlights(
+        db,
+        InflightRequest,
+        lease=app.config['LLM_TIMEOUT'] * 2,
+        result_ttl=app.config['SINGLE_FLIGHT_RESULT_TTL']
+    ) if app.config['SINGLE_FLIGHT_SHARED'] else None,
+    wait_timeout=app.config['LLM_TIMEOUT'] * 2
+)
+
+class UsageLimitReached(Exception):
+    """Raised by a coalesced call when the user's plan limit is reached"""
 
 # Story generation endpoint using OpenAI GPT
 @app.route("/api/generate-story", methods=["POST"])
@@ -479,11 +1844,6 @@ def generate_story():
     if not user:
         return jsonify({"message": "Authentication required"}), 401
     
-    # Check usage limits
-    can_use, message = user.check_usage_limit('ai_enhancements')
-    if not can_use:
-        return jsonify({"message": message}), 429
-    
     data = request.get_json()
     story_type = data.get("storyType", "")
     title = data.get("title", "")
@@ -494,50 +1854,173 @@ def generate_story():
         return jsonify({"message": "Story title and answers are required"}), 400
     
     try:
-        # Create a prompt for story generation
-        prompt = f"""
+        messages = story_messages(story_type, title, answers)
+    except Exception as e:
+        return jsonify({
+            "message": "Story generation failed",
+            "error": str(e)
+        }), 500
+    
+    if wants_event_stream():
+        # Reserve a unit up front; stream_story releases it if generation fails
+        reserved, message = user.reserve_usage('ai_enhancements')
+        if not reserved:
+            return jsonify({"message": message}), 429
+        return event_stream(stream_story(user, messages))
+    
+    # Double clicks and retries share one generation, and one usage unit
+    try:
+        body = ai_flights.do(
+            flight_key(user.id, 'generate-story', data),
+            lambda: run_story_generation(user, messages)
+        )
+    except UsageLimitReached as e:
+        return jsonify({"message": str(e)}), 429
+    except Exception as e:
+        return jsonify({
+            "message": "Story generation failed",
+            "error": str(e)
+        }), 500
+    return jsonify(body), 200
+
+def story_messages(story_type, title, answers):
+    # Create a prompt for story generation
+    prompt = f"""
         Create a compelling {story_type} story titled "{title}" based on the following interview responses:
         
         """
-        
-        for question_index, answer in answers.items():
-            prompt += f"Q{int(question_index) + 1}: {answer}\n\n"
-        
-        prompt += """
+    
+    for question_index, answer in answers.items():
+        prompt += f"Q{int(question_index) + 1}: {answer}\n\n"
+    
+    prompt += """
         Please write this as a well-structured, engaging narrative that flows naturally. 
         Use descriptive language and maintain the authentic voice of the storyteller.
         Format the story with proper paragraphs and make it suitable for a book.
         """
-        
-        # Use OpenAI GPT to generate the story
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a professional ghostwriter specializing in personal narratives and life stories. Create engaging, well-structured stories that honor the authentic voice of the storyteller."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
-        
-        generated_story = response.choices[0].message.content
-        
-        # Increment usage counter
-        user.increment_usage('ai_enhancements')
-        
-        return jsonify({
+    
+    return [
+        {"role": "system", "content": "You are a professional ghostwriter specializing in personal narratives and life stories. Create engaging, well-structured stories that honor the authentic voice of the storyteller."},
+        {"role": "user", "content": prompt}
+    ]
+
+def run_story_generation(user, messages):
+    # The response body, shared by coalesced requests (see ai_flights);
+    # failures raise. Reserve a unit up front; released if generation fails
+    reserved, message = user.reserve_usage('ai_enhancements')
+    if not reserved:
+        raise UsageLimitReached(message)
+    
+    try:
+        completion = llm.complete(messages, model=app.config['LLM_MODEL'], max_tokens=2000, temperature=0.7)
+    except Exception:
+        user.release_usage('ai_enhancements')
+        raise
+    
+    return {
+        "message": "Story generated successfully",
+        "story": completion.text,
+        "usage": f"AI enhancements used: {user.monthly_ai_enhancements}"
+    }
+
+def stream_story(user, messages):
+    # Tokens as SSE 'token' events, then a 'done' event with the same body
+    # as the JSON response. The reserved unit is kept once the story has
+    # started, also if the client goes away; it is released if nothing was
+    # generated or the API failed.
+    parts = []
+    keep_usage = False
+    try:
+        for text in llm.stream(messages, model=app.config['LLM_MODEL'], max_tokens=2000, temperature=0.7):
+            parts.append(text)
+            yield sse_event('token', {"text": text})
+        keep_usage = True
+        yield sse_event('done', {
             "message": "Story generated successfully",
-            "story": generated_story,
+            "story": ''.join(parts),
             "usage": f"AI enhancements used: {user.monthly_ai_enhancements}"
-        }), 200
-        
+        })
+    except GeneratorExit:
+        keep_usage = bool(parts)
+        raise
     except Exception as e:
-        return jsonify({
-            "message": "Story generation failed",
-            "error": str(e)
-        }), 500
+        print(f"Story generation error: {str(e)}")
+        yield sse_event('error', {"message": "Story generation failed", "error": str(e)})
+    finally:
+        if not keep_usage:
+            user.release_usage('ai_enhancements')
 
 
+# Bump when the enhancement prompts change, so cached results of the old
+# prompts are no longer served
+ENHANCE_PROMPT_VERSION = 1
+
+# Hot entries are kept in process, in front of the shared table
+enhancement_memory_cache = LRUCache(
+    max_size=app.config['ENHANCE_CACHE_MEMORY_SIZE'],
+    ttl=app.config['ENHANCE_CACHE_MEMORY_TTL']
+)
+
+def normalize_enhancement_text(text):
+    # Whitespace differences don't change the enhancement
+    lines = (' '.join(line.split()) for line in unicodedata.normalize('NFC', text).strip().splitlines())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines))
+
+def enhancement_cache_key(text, enhancement_type):
+    key = '\0'.join((
+        str(ENHANCE_PROMPT_VERSION), app.config['LLM_MODEL'], str(enhancement_type), normalize_enhancement_text(text)
+    ))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def cached_enhancement(key):
+    """The cached enhanced text for this key, or None if there is none within retention"""
+    if not app.config['ENHANCE_CACHE_DAYS']:
+        return None
+    enhanced_text = enhancement_memory_cache.get(key)
+    if enhanced_text is not None:
+        metrics.increment('enhance_cache_memory_hits')
+        return enhanced_text
+    
+    entry = (
+        EnhancementCacheEntry.query
+        .filter_by(key=key)
+        .filter(EnhancementCacheEntry.created_at >= utcnow_naive() - datetime.timedelta(days=app.config['ENHANCE_CACHE_DAYS']))
+        .first()
+    )
+    if entry is None:
+        metrics.increment('enhance_cache_misses')
+        return None
+    metrics.increment('enhance_cache_disk_hits')
+    # Not beyond the stored entry's own expiry
+    expires_at = entry.created_at + datetime.timedelta(days=app.config['ENHANCE_CACHE_DAYS'])
+    enhancement_memory_cache.set(key, entry.enhanced_text, ttl=(expires_at - utcnow_naive()).total_seconds())
+    return entry.enhanced_text
+
+def cache_enhancement(key, enhancement_type, enhanced_text):
+    if not app.config['ENHANCE_CACHE_DAYS']:
+        return
+    enhancement_memory_cache.set(key, enhanced_text)
+    entry = EnhancementCacheEntry.query.filter_by(key=key).first() or EnhancementCacheEntry(key=key)
+    entry.enhancement_type = str(enhancement_type)[:50]
+    entry.model = app.config['LLM_MODEL']
+    entry.enhanced_text = enhanced_text
+    entry.created_at = utcnow_naive()
+    db.session.add(entry)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request cached the same text first
+        db.session.rollback()
+        return
+    # Size bound: ids grow with insertion, so the oldest entries are below
+    # the newest id by more than the limit (one indexed range delete)
+    stale = EnhancementCacheEntry.query.filter(
+        EnhancementCacheEntry.id <= entry.id - app.config['ENHANCE_CACHE_MAX_ENTRIES']
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    if stale:
+        metrics.increment('enhance_cache_evictions', stale)
+
 # Text enhancement endpoint
 @app.route('/api/enhance-text', methods=['POST'])
 def enhance_text():
@@ -549,36 +2032,37 @@ def enhance_text():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
-        # Use OpenAI to enhance the text
-        import openai
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        
-        if enhancement_type == 'storytelling':
-            prompt = f"""Please enhance the following text for storytelling purposes. Improve grammar, clarity, and narrative flow while preserving the authentic voice and meaning. Make it more engaging and well-structured for a life story:
-
-Text to enhance: {text}
-
-Enhanced version:"""
+        # Identical requests are served from the cache unless the client
+        # asks for a fresh variant, which then replaces the cached one
+        key = enhancement_cache_key(text, enhancement_type)
+        if data.get('fresh'):
+            metrics.increment('enhance_cache_bypasses')
         else:
-            prompt = f"""Please improve the following text for clarity, grammar, and readability while preserving the original meaning and voice:
-
-Text to enhance: {text}
-
-Improved version:"""
+            cached = cached_enhancement(key)
+            if cached is not None:
+                return jsonify({
+                    'enhanced_text': cached,
+                    'original_text': text,
+                    'enhancement_type': enhancement_type,
+                    'cached': True
+                })
         
-        response = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        enhanced_text = response.choices[0].text.strip()
+        # Concurrent identical requests (the editor re-submitting, double
+        # clicks) share one call; a fresh variant is always its own call
+        if data.get('fresh'):
+            enhanced_text = run_enhancement(key, text, enhancement_type)
+        else:
+            user = get_user_from_token(request)
+            enhanced_text = ai_flights.do(
+                flight_key(user.id if user else None, 'enhance-text', data),
+                lambda: run_enhancement(key, text, enhancement_type)
+            )
         
         return jsonify({
             'enhanced_text': enhanced_text,
             'original_text': text,
-            'enhancement_type': enhancement_type
+            'enhancement_type': enhancement_type,
+            'cached': False
         })
         
     except Exception as e:
@@ -587,10 +2071,33 @@ Improved version:"""
 
 
 
+def run_enhancement(key, text, enhancement_type):
+    if enhancement_type == 'storytelling':
+        prompt = f"""Please enhance the following text for storytelling purposes. Improve grammar, clarity, and narrative flow while preserving the authentic voice and meaning. Make it more engaging and well-structured for a life story:
+
+Text to enhance: {text}
+
+Enhanced version:"""
+    else:
+        prompt = f"""Please improve the following text for clarity, grammar, and readability while preserving the original meaning and voice:
+
+Text to enhance: {text}
+
+Improved version:"""
+    
+    completion = llm.complete(
+        [{"role": "user", "content": prompt}],
+        model=app.config['LLM_MODEL'],
+        max_tokens=500,
+        temperature=0.7
+    )
+    
+    enhanced_text = completion.text.strip()
+    cache_enhancement(key, enhancement_type, enhanced_text)
+    return enhanced_text
+
 # AI Interviewer System Integration
-import json
 import uuid
-from datetime import datetime
 
 # In-memory storage for AI interview sessions (in production, use a database)
 ai_sessions = {}
@@ -620,11 +2127,13 @@ Your approach is warm, patient, and deeply curious about the human experience. Y
         # Initialize session
         ai_sessions[session_id] = {
             'user_id': user.id,
-            'created_at': datetime.utcnow().isoformat(),
+            'created_at': datetime.datetime.utcnow().isoformat(),
             'phase': 'discovery',
             'story_type': None,
             'themes': [],
             'messages': [],
+            'summary': '',  # older turns, see interview_context.fit_context
+            'summarized': 0,
             'system_prompt': system_prompt
         }
         
@@ -664,56 +2173,73 @@ def process_response():
     session['messages'].append({
         'role': 'user',
         'content': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.datetime.utcnow().isoformat()
     })
     
+    messages = interview_context(session)
+    if wants_event_stream():
+        return event_stream(stream_interview_reply(session, message, messages))
+    
     try:
-        # Use OpenAI to generate AI response
-        import openai
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        
-        # Build conversation context
-        messages = [
-            {"role": "system", "content": session['system_prompt']},
-        ]
-        
-        # Add recent conversation history
-        for msg in session['messages'][-10:]:  # Last 10 messages for context
-            messages.append({
-                "role": "user" if msg['role'] == 'user' else "assistant",
-                "content": msg['content']
-            })
-        
         # Generate response
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.8
-        )
-        
-        ai_response = response.choices[0].message.content.strip()
-        
-        # Add AI response to session
-        session['messages'].append({
-            'role': 'ai',
-            'content': ai_response,
-            'timestamp': datetime.utcnow().isoformat()
-        })
-        
-        # Analyze response to update session state
-        session = analyze_and_update_session(session, message, ai_response)
-        
-        return jsonify({
-            "message": ai_response,
-            "phase": session['phase'],
-            "story_type": session['story_type'],
-            "themes": session['themes']
-        })
+        completion = llm.complete(messages, model=app.config['LLM_MODEL'], max_tokens=500, temperature=0.8)
+        return jsonify(record_interview_reply(session, message, completion.text.strip()))
         
     except Exception as e:
         print(f"AI response error: {str(e)}")
-        return jsonify({"message": "I'm having trouble processing your response right now. Could you please try again?"}), 500
+        return jsonify({"message": INTERVIEW_ERROR_MESSAGE}), 500
+
+INTERVIEW_ERROR_MESSAGE = "I'm having trouble processing your response right now. Could you please try again?"
+
+def interview_context(session):
+    # Recent turns verbatim, older ones as a running summary, within the
+    # token budget (see interview_context.py)
+    return fit_context(
+        session,
+        llm,
+        app.config['LLM_MODEL'],
+        budget=app.config['INTERVIEW_CONTEXT_TOKENS'],
+        summary_tokens=app.config['INTERVIEW_SUMMARY_TOKENS']
+    )
+
+def record_interview_reply(session, message, ai_response):
+    # Add AI response to session
+    session['messages'].append({
+        'role': 'ai',
+        'content': ai_response,
+        'timestamp': datetime.datetime.utcnow().isoformat()
+    })
+    
+    # Analyze response to update session state
+    session = analyze_and_update_session(session, message, ai_response)
+    
+    return {
+        "message": ai_response,
+        "phase": session['phase'],
+        "story_type": session['story_type'],
+        "themes": session['themes']
+    }
+
+def stream_interview_reply(session, message, messages):
+    # Tokens as SSE 'token' events, then a 'done' event with the same body
+    # as the JSON response. If the client goes away mid-reply, what it was
+    # sent is recorded in the session, since it has been seen; a reply cut
+    # off by an upstream error is not, as the client was told it failed.
+    parts = []
+    try:
+        for text in llm.stream(messages, model=app.config['LLM_MODEL'], max_tokens=500, temperature=0.8):
+            parts.append(text)
+            yield sse_event('token', {"text": text})
+    except GeneratorExit:
+        reply = ''.join(parts).strip()
+        if reply:
+            record_interview_reply(session, message, reply)
+        raise
+    except Exception as e:
+        print(f"AI response error: {str(e)}")
+        yield sse_event('error', {"message": INTERVIEW_ERROR_MESSAGE})
+        return
+    yield sse_event('done', record_interview_reply(session, message, ''.join(parts).strip()))
 
 def analyze_and_update_session(session, user_message, ai_response):
     """Analyze the conversation to update session state"""
@@ -778,15 +2304,24 @@ def generate_outline():
     session = ai_sessions[session_id]
     
     try:
-        # Extract user responses from conversation
-        user_responses = [msg['content'] for msg in session['messages'] if msg['role'] == 'user']
-        conversation_text = '\n\n'.join(user_responses)
-        
-        # Use OpenAI to generate book outline
-        import openai
-        openai.api_key = os.getenv('OPENAI_API_KEY')
+        # Concurrent identical requests share one call; the message count
+        # keeps an outline of an older state of the session from being reused
+        outline = ai_flights.do(
+            flight_key(user.id, 'generate-outline', data, len(session['messages'])),
+            lambda: build_outline(session)
+        )
+        return jsonify(outline)
         
-        prompt = f"""Based on this interview conversation, create a detailed book outline:
+    except Exception as e:
+        print(f"Outline generation error: {str(e)}")
+        return jsonify({"message": "Failed to generate outline"}), 500
+
+def build_outline(session):
+    # Extract user responses from conversation
+    user_responses = [msg['content'] for msg in session['messages'] if msg['role'] == 'user']
+    conversation_text = '\n\n'.join(user_responses)
+    
+    prompt = f"""Based on this interview conversation, create a detailed book outline:
 
 Story Type: {session['story_type'] or 'Personal Story'}
 Themes: {', '.join(session['themes'])}
@@ -810,39 +2345,35 @@ Format as JSON with this structure:
         {{"title": "Chapter Title", "theme": "What this chapter explores"}}
     ]
 }}"""
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        outline_text = response.choices[0].message.content.strip()
-        
-        # Try to parse as JSON, fallback to text if needed
-        try:
-            outline = json.loads(outline_text)
-        except:
-            # Fallback outline structure
-            outline = {
-                "title": f"My {session['story_type'] or 'Personal'} Story",
-                "book_type": session['story_type'] or 'memoir',
-                "estimated_length": "150-200 pages",
-                "themes": session['themes'],
-                "chapters": [
-                    {"title": "The Beginning", "theme": "Setting the stage for your story"},
-                    {"title": "The Journey", "theme": "Key experiences and turning points"},
-                    {"title": "Lessons Learned", "theme": "Wisdom gained from your experiences"},
-                    {"title": "Looking Forward", "theme": "How your story continues"}
-                ]
-            }
-        
-        return jsonify(outline)
-        
-    except Exception as e:
-        print(f"Outline generation error: {str(e)}")
-        return jsonify({"message": "Failed to generate outline"}), 500
+    
+    completion = llm.complete(
+        [{"role": "user", "content": prompt}],
+        model=app.config['LLM_MODEL'],
+        max_tokens=1000,
+        temperature=0.7
+    )
+    
+    outline_text = completion.text.strip()
+    
+    # Try to parse as JSON, fallback to text if needed
+    try:
+        outline = json.loads(outline_text)
+    except:
+        # Fallback outline structure
+        outline = {
+            "title": f"My {session['story_type'] or 'Personal'} Story",
+            "book_type": session['story_type'] or 'memoir',
+            "estimated_length": "150-200 pages",
+            "themes": session['themes'],
+            "chapters": [
+                {"title": "The Beginning", "theme": "Setting the stage for your story"},
+                {"title": "The Journey", "theme": "Key experiences and turning points"},
+                {"title": "Lessons Learned", "theme": "Wisdom gained from your experiences"},
+                {"title": "Looking Forward", "theme": "How your story continues"}
+            ]
+        }
+    
+    return outline
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
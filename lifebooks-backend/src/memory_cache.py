@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with a per-entry lifetime.
+
+    Per process; use it in front of a shared store so repeated lookups of
+    hot keys skip the round trip. Subclasses that index entries override
+    ``_added`` and ``_removed``, which run under the cache's lock.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None on miss/expiry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache a value for ``ttl`` seconds (default: the cache's ttl)"""
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + lifetime, value)
+            self._added(key, value)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _expires_at, value = self._entries.pop(key)
+        self._removed(key, value)
+
+    def _added(self, key, value):
+        pass
+
+    def _removed(self, key, value):
+        pass
@@ -0,0 +1,29 @@
+import threading
+
+
+class Metrics:
+    """Process-wide counters, safe to update from any thread.
+
+    Counters only go up; gauges (e.g. uploads in progress) are counters
+    that are also decremented.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    def set_max(self, name, value):
+        # High-water mark
+        with self._lock:
+            self._values[name] = max(self._values.get(name, value), value)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+metrics = Metrics()
@@ -1,10 +1,29 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timezone
+from flask.cli import with_appcontext
+from datetime import datetime, timezone, timedelta
 import bcrypt
+import click
+import hashlib
 import json
+import os
+import zlib
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+from chunking import split_chunks
+from text_stats import TextStats, update_stats, reading_minutes
+import search_index
+from usage_reset import reset_due_usage
+from text_patch import content_hash
 
 db = SQLAlchemy()
 
+# bcrypt cost factor (log2 rounds)
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+def _current_month_start():
+    return datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -28,7 +47,7 @@ class User(db.Model):
     recordings_this_month = db.Column(db.Integer, default=0)
     ai_enhancements_this_month = db.Column(db.Integer, default=0)
     books_created = db.Column(db.Integer, default=0)
-    usage_reset_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).replace(day=1))
+    usage_reset_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).replace(day=1), index=True)
     
     # Relationships
     stories = db.relationship('Story', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -36,22 +55,41 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
     
     def check_password(self, password):
         """Check if provided password matches hash"""
         return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
     
     def reset_monthly_usage_if_needed(self):
-        """Reset monthly usage counters if it's a new month"""
-        now = datetime.now(timezone.utc)
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        """Reset this user's counters in memory if it's a new month.
+
+        Persisting is left to the caller's commit; the batch job in
+        reset_due_usage is what normally resets stored counters.
+        """
+        current_month_start = _current_month_start()
+        reset_date = self.usage_reset_date
+        if reset_date is not None and reset_date.tzinfo is None:
+            reset_date = reset_date.replace(tzinfo=timezone.utc)
         
-        if self.usage_reset_date < current_month_start:
+        if reset_date is None or reset_date < current_month_start:
             self.recordings_this_month = 0
             self.ai_enhancements_this_month = 0
             self.usage_reset_date = current_month_start
-            db.session.commit()
+    
+    @classmethod
+    def reset_due_usage(cls, chunk_size=1000):
+        """Reset counters of every user whose usage predates this month"""
+        current_month_start = _current_month_start().replace(tzinfo=None)
+        return reset_due_usage(
+            db.session,
+            cls,
+            [cls.recordings_this_month, cls.ai_enhancements_this_month],
+            cls.usage_reset_date,
+            cutoff=current_month_start - timedelta(microseconds=1),
+            reset_to=current_month_start,
+            chunk_size=chunk_size
+        )
     
     def increment_usage(self, usage_type):
         """Increment usage counter"""
@@ -123,17 +161,21 @@ class Story(db.Model):
     title = db.Column(db.String(500), nullable=False)
     content = db.Column(db.Text)
     summary = db.Column(db.Text)
-    tags = db.Column(db.Text)  # JSON string of tags
+    tags = db.Column(db.Text)  # legacy JSON string of tags; tags now live in story_tags
     
     # Metadata
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     last_auto_save = db.Column(db.DateTime)
+    content_hash = db.Column(db.String(64))  # sha256 of content, to skip no-op auto-saves
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Status and settings
     is_published = db.Column(db.Boolean, default=False)
     is_draft = db.Column(db.Boolean, default=True)
     word_count = db.Column(db.Integer, default=0)
+    character_count = db.Column(db.Integer, default=0)
+    text_stats = db.Column(db.Text)  # JSON per-chapter counts, see text_stats.TextStats
     
     # Book generation
     cover_image_url = db.Column(db.String(1000))
@@ -142,41 +184,56 @@ class Story(db.Model):
     # Relationships
     voice_recordings = db.relationship('VoiceRecording', backref='story', lazy=True, cascade='all, delete-orphan')
     auto_saves = db.relationship('AutoSave', backref='story', lazy=True, cascade='all, delete-orphan')
+    tag_rows = db.relationship('StoryTag', order_by='StoryTag.position', lazy=True, cascade='all, delete-orphan')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def update_word_count(self):
         """Update word count based on content"""
-        if self.content:
-            self.word_count = len(self.content.split())
-        else:
-            self.word_count = 0
+        self.apply_text_stats(TextStats.from_text(self.content))
+    
+    def set_content(self, content):
+        """Set content, updating stats from the changed span only"""
+        stats = update_stats(TextStats.from_json(self.text_stats), self.content, content)
+        self.content = content
+        self.apply_text_stats(stats)
+    
+    def apply_text_stats(self, stats):
+        """Store word, character and per-chapter counts"""
+        self.word_count = stats.words
+        self.character_count = stats.characters
+        self.text_stats = stats.to_json()
     
     def get_tags_list(self):
         """Get tags as a list"""
-        if self.tags:
-            try:
-                return json.loads(self.tags)
-            except:
-                return []
-        return []
+        return [row.tag for row in self.tag_rows]
     
     def set_tags_list(self, tags_list):
-        """Set tags from a list"""
-        self.tags = json.dumps(tags_list)
+        """Set tags from a list, reusing the rows of tags that are kept"""
+        existing = {row.tag: row for row in self.tag_rows}
+        self.tag_rows = [existing.get(tag) or StoryTag(tag=tag, user_id=self.user_id) for tag in normalize_tags(tags_list)]
+        for position, row in enumerate(self.tag_rows):
+            row.position = position
     
     def auto_save_content(self, content):
-        """Auto-save content with timestamp"""
-        self.content = content
-        self.update_word_count()
+        """Auto-save content with timestamp; returns False if nothing changed"""
+        new_hash = content_hash(content)
+        if new_hash == self.content_hash:
+            return False
+        
+        self.set_content(content)
+        self.content_hash = new_hash
         self.last_auto_save = datetime.now(timezone.utc)
         
         # Create auto-save record
         auto_save = AutoSave(
             story_id=self.id,
-            content=content,
             word_count=self.word_count
         )
+        auto_save.set_content(content)
         db.session.add(auto_save)
         db.session.commit()
+        return True
     
     def to_dict(self):
         """Convert story to dictionary"""
@@ -192,9 +249,27 @@ class Story(db.Model):
             'is_published': self.is_published,
             'is_draft': self.is_draft,
             'word_count': self.word_count,
-            'cover_image_url': self.cover_image_url
+            'character_count': self.character_count,
+            'reading_minutes': reading_minutes(self.word_count),
+            'cover_image_url': self.cover_image_url,
+            'version': self.version
         }
 
+def normalize_tags(tags_list):
+    """Trimmed, non-empty, unique tags in the order given"""
+    return list(dict.fromkeys(tag for tag in (str(tag).strip()[:100] for tag in tags_list or []) if tag))
+
+class StoryTag(db.Model):
+    __tablename__ = 'story_tags'
+    __table_args__ = (
+        db.Index('ix_story_tags_user_tag', 'user_id', 'tag', 'story_id'),
+    )
+    
+    story_id = db.Column(db.Integer, db.ForeignKey('stories.id'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # copied from the story
+    position = db.Column(db.Integer, nullable=False, default=0)
+
 class VoiceRecording(db.Model):
     __tablename__ = 'voice_recordings'
     
@@ -211,8 +286,12 @@ class VoiceRecording(db.Model):
     
     # Transcription
     transcript = db.Column(db.Text)
+    transcript_segments = db.Column(db.Text)  # JSON [{start, end, text}], start/end in seconds
     transcript_confidence = db.Column(db.Float)
-    processing_status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
+    processing_status = db.Column(db.String(50), default='pending', index=True)  # pending, processing, completed, failed
+    error_message = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    started_at = db.Column(db.DateTime)  # job claim time, renewed while processing
     
     # Metadata
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -227,32 +306,135 @@ class VoiceRecording(db.Model):
             'format': self.format,
             'transcript': self.transcript,
             'processing_status': self.processing_status,
+            'error': self.error_message,
             'created_at': self.created_at.isoformat(),
             'processed_at': self.processed_at.isoformat() if self.processed_at else None
         }
 
+search_index.register_searchable(Story, 'story', title='title', body=('content', 'summary'))
+search_index.register_searchable(VoiceRecording, 'recording', title='filename', body=('transcript',))
+
+@event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    """create_all also creates the search table the models above write to"""
+    search_index.create_search_index(connection)
+
 class AutoSave(db.Model):
     __tablename__ = 'auto_saves'
     
     id = db.Column(db.Integer, primary_key=True)
     story_id = db.Column(db.Integer, db.ForeignKey('stories.id'), nullable=False, index=True)
     
-    # Content snapshot
+    # Content snapshot: legacy rows hold a full copy in content, new ones
+    # reference deduplicated chunks in order
     content = db.Column(db.Text)
     word_count = db.Column(db.Integer, default=0)
     
     # Metadata
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
+    # Relationships
+    chunk_refs = db.relationship('AutoSaveChunk', lazy=True, order_by='AutoSaveChunk.position', cascade='all, delete-orphan')
+    
+    def set_content(self, text):
+        """Store the snapshot as references into the content-addressed chunk store"""
+        pieces = split_chunks(text or '')
+        try:
+            with db.session.begin_nested():
+                chunks = ContentChunk.get_or_create(pieces)
+        except IntegrityError:
+            # A concurrent save inserted some of the same chunks; they exist now
+            chunks = ContentChunk.get_or_create(pieces)
+        self.content = None
+        self.chunk_refs = [AutoSaveChunk(position=i, chunk=chunk) for i, chunk in enumerate(chunks)]
+    
+    def get_content(self):
+        """Reconstruct the snapshot text"""
+        if not self.chunk_refs and self.content is not None:
+            return self.content
+        rows = (
+            db.session.query(ContentChunk.data)
+            .join(AutoSaveChunk, AutoSaveChunk.chunk_id == ContentChunk.id)
+            .filter(AutoSaveChunk.auto_save_id == self.id)
+            .order_by(AutoSaveChunk.position)
+        )
+        return ''.join(zlib.decompress(data).decode('utf-8') for (data,) in rows)
+    
     def to_dict(self):
         """Convert auto-save to dictionary"""
         return {
             'id': self.id,
-            'content': self.content,
+            'content': self.get_content(),
             'word_count': self.word_count,
             'created_at': self.created_at.isoformat()
         }
 
+class ContentChunk(db.Model):
+    __tablename__ = 'content_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 of the UTF-8 text
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed UTF-8 text
+    size = db.Column(db.Integer, nullable=False)  # uncompressed bytes
+    
+    # Metadata
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    last_referenced_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    
+    # Hashes looked up per query, well under SQLite's bound-parameter limit
+    LOOKUP_BATCH_SIZE = 500
+    
+    @classmethod
+    def get_or_create(cls, pieces):
+        """Return one chunk per piece, inserting only pieces not stored yet"""
+        encoded = [piece.encode('utf-8') for piece in pieces]
+        hashes = [hashlib.sha256(data).hexdigest() for data in encoded]
+        unique_hashes = list(dict.fromkeys(hashes))
+        
+        by_hash = {}
+        for start in range(0, len(unique_hashes), cls.LOOKUP_BATCH_SIZE):
+            batch = unique_hashes[start:start + cls.LOOKUP_BATCH_SIZE]
+            for chunk in cls.query.options(load_only(cls.id, cls.hash)).filter(cls.hash.in_(batch)):
+                by_hash[chunk.hash] = chunk
+        
+        if by_hash:
+            # Keep reused chunks out of the garbage collector's grace window
+            cls.query.filter(cls.id.in_([chunk.id for chunk in by_hash.values()])).update(
+                {cls.last_referenced_at: datetime.now(timezone.utc)}, synchronize_session=False
+            )
+        
+        for chunk_hash, data in zip(hashes, encoded):
+            if chunk_hash not in by_hash:
+                chunk = cls(hash=chunk_hash, data=zlib.compress(data), size=len(data))
+                db.session.add(chunk)
+                by_hash[chunk_hash] = chunk
+        db.session.flush()
+        
+        return [by_hash[chunk_hash] for chunk_hash in hashes]
+    
+    @classmethod
+    def collect_garbage(cls, grace=timedelta(hours=1)):
+        """Delete chunks no snapshot references; returns the number deleted.
+
+        Chunks referenced within ``grace`` are kept so a save that picked an
+        existing chunk but has not committed yet cannot lose it.
+        """
+        cutoff = datetime.now(timezone.utc) - grace
+        referenced = db.session.query(AutoSaveChunk.chunk_id).filter(AutoSaveChunk.chunk_id == cls.id)
+        deleted = cls.query.filter(~referenced.exists(), cls.last_referenced_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+class AutoSaveChunk(db.Model):
+    __tablename__ = 'auto_save_chunks'
+    
+    auto_save_id = db.Column(db.Integer, db.ForeignKey('auto_saves.id'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    chunk_id = db.Column(db.Integer, db.ForeignKey('content_chunks.id'), nullable=False, index=True)
+    
+    # Relationships
+    chunk = db.relationship('ContentChunk', lazy=True)
+
 class DataBackup(db.Model):
     __tablename__ = 'data_backups'
     
@@ -280,3 +462,15 @@ class DataBackup(db.Model):
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
+@click.command('collect-autosave-chunks')
+@click.option('--grace-hours', type=float, default=1.0, help='Keep chunks referenced this recently')
+@with_appcontext
+def collect_autosave_chunks_command(grace_hours):
+    """Delete content chunks no auto-save snapshot references"""
+    deleted = ContentChunk.collect_garbage(grace=timedelta(hours=grace_hours))
+    click.echo(f"Deleted {deleted} unreferenced chunks")
+
+def init_app(app):
+    """Bind these models to an app and register their CLI commands"""
+    db.init_app(app)
+    app.cli.add_command(collect_autosave_chunks_command)
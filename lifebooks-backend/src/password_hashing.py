@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing pool has no free worker or queue slot"""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a bounded worker pool.
+
+    At most ``max_workers`` hashes run at once and at most ``max_queue`` more
+    may wait; anything beyond that is rejected immediately with
+    HashingPoolSaturated so callers can answer 503 instead of piling up.
+
+    The calling thread still blocks until its hash is done, queue wait
+    included, so the pool does not free a sync worker: it caps how many of
+    a process's request threads can be tied up hashing at once. Keep
+    ``max_workers + max_queue`` below the request threads per process
+    (gunicorn ``--threads``) so a login storm gets 503s while the other
+    threads keep serving.
+    """
+
+    def __init__(self, iterations=600000, max_workers=2, max_queue=16, timeout=10):
+        self.method = f'pbkdf2:sha256:{iterations}'
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored werkzeug or legacy bcrypt hash"""
+        if not password_hash:
+            return False
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            return self._run(_check_bcrypt_hash, password_hash, password)
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash uses another scheme or cost than configured"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _future: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingPoolSaturated()
+
+
+def _check_bcrypt_hash(password_hash, password):
+    # Hashes written by models.User; bcrypt is only needed to verify them
+    import bcrypt
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
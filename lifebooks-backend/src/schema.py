@@ -0,0 +1,43 @@
+from sqlalchemy import inspect, text
+
+
+def ensure_schema(db):
+    """Bring existing tables up to date with the models.
+
+    ``db.create_all()`` only creates missing tables; this adds columns and
+    indexes that were declared after a table was first created. New columns
+    must be nullable or carry a ``server_default`` so existing rows get a
+    value. Call it inside an app context after ``create_all``.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                _add_column(engine, table, column)
+
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(engine, checkfirst=True)
+
+
+def _add_column(engine, table, column):
+    preparer = engine.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.format_table(table)} "
+        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+    )
+    if column.server_default is not None:
+        default = column.server_default.arg
+        ddl += f" DEFAULT '{default}'" if isinstance(default, str) else f" DEFAULT {default.text}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    with engine.begin() as connection:
+        connection.execute(text(ddl))
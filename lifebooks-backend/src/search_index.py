@@ -0,0 +1,170 @@
+"""Full-text search over a user's documents.
+
+The app indexes stories and voice recording transcripts. Interview answers
+are only indexed by apps that persist them as interview_models'
+InterviewResponse; main.py keeps its interviews in memory.
+
+Documents live in one index table: an FTS5 virtual table on SQLite, or a
+table with a generated, GIN-indexed tsvector on PostgreSQL. Models opt in
+with ``register_searchable``, which keeps the index in sync from ORM events
+inside the same transaction as the write.
+
+Each document's row id is derived from its kind and primary key, so updates
+and deletes address a single row. On SQLite the owner is stored as an
+indexed token (``u<id>``) and every query is ANDed with it, so a search
+only walks the postings of the user's own documents.
+"""
+import html
+import re
+from sqlalchemy import event, inspect, text
+
+# Document kinds and the code mixed into their index row ids
+KIND_CODES = {'story': 1, 'recording': 2, 'response': 3}
+KINDS_BY_CODE = {code: kind for kind, code in KIND_CODES.items()}
+_KIND_BITS = 8
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Private-use characters the database puts around matches; snippets are
+# HTML-escaped before they become <mark> tags, and are stripped from
+# indexed text so a document can't forge them
+_MATCH_START, _MATCH_END = '\ue000', '\ue001'
+_NO_MARKERS = {ord(_MATCH_START): None, ord(_MATCH_END): None}
+
+
+def document_rowid(kind, doc_id):
+    return doc_id * _KIND_BITS + KIND_CODES[kind]
+
+
+def create_search_index(connection):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS search_documents ("
+            " id BIGINT PRIMARY KEY,"
+            " user_id INTEGER NOT NULL,"
+            " title TEXT,"
+            " body TEXT,"
+            " document TSVECTOR GENERATED ALWAYS AS ("
+            "  setweight(to_tsvector('english', coalesce(title, '')), 'A') ||"
+            "  setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_user_id ON search_documents (user_id)"
+        ))
+    else:
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+            "USING fts5(owner, title, body, tokenize='porter unicode61')"
+        ))
+
+
+def index_document(connection, kind, doc_id, user_id, title, body):
+    rowid = document_rowid(kind, doc_id)
+    params = {
+        'rowid': rowid,
+        'user_id': user_id,
+        'title': (title or '').translate(_NO_MARKERS),
+        'body': (body or '').translate(_NO_MARKERS)
+    }
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            "INSERT INTO search_documents (id, user_id, title, body) VALUES (:rowid, :user_id, :title, :body) "
+            "ON CONFLICT (id) DO UPDATE SET user_id = excluded.user_id, title = excluded.title, body = excluded.body"
+        ), params)
+    else:
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), params)
+        connection.execute(text(
+            "INSERT INTO search_index (rowid, owner, title, body) VALUES (:rowid, :owner, :title, :body)"
+        ), dict(params, owner=f'u{user_id}'))
+
+
+def remove_document(connection, kind, doc_id):
+    table = 'search_documents' if connection.dialect.name == 'postgresql' else 'search_index'
+    id_column = 'id' if table == 'search_documents' else 'rowid'
+    connection.execute(text(f"DELETE FROM {table} WHERE {id_column} = :rowid"), {'rowid': document_rowid(kind, doc_id)})
+
+
+def search(connection, user_id, query, limit=20, offset=0):
+    """Ranked matches for ``query`` among ``user_id``'s documents.
+
+    Returns dicts with kind, id, title (plain text), snippet (HTML: the
+    escaped text with matches wrapped in <mark>) and rank (higher is better).
+    """
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset, 'start': _MATCH_START, 'end': _MATCH_END}
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(text(
+            "SELECT d.id, d.title, "
+            " ts_headline('english', d.body, q, "
+            "  'StartSel=' || :start || ', StopSel=' || :end || ', MaxWords=24, MinWords=8') AS snippet, "
+            " ts_rank(d.document, q) AS rank "
+            "FROM search_documents d, websearch_to_tsquery('english', :query) q "
+            "WHERE d.user_id = :user_id AND d.document @@ q "
+            "ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        ), dict(params, query=query))
+    else:
+        match = _fts5_query(query)
+        if not match:
+            return []
+        rows = connection.execute(text(
+            "SELECT rowid, title, "
+            " snippet(search_index, 2, :start, :end, '…', 16) AS snippet, "
+            " -bm25(search_index, 0.0, 5.0, 1.0) AS rank "
+            "FROM search_index WHERE search_index MATCH :match "
+            "ORDER BY bm25(search_index, 0.0, 5.0, 1.0) LIMIT :limit OFFSET :offset"
+        ), dict(params, match=f'owner:u{user_id} AND ({match})'))
+
+    return [
+        {
+            'kind': KINDS_BY_CODE[rowid % _KIND_BITS],
+            'id': rowid // _KIND_BITS,
+            'title': title,
+            'snippet': _highlight(snippet),
+            'rank': rank
+        }
+        for rowid, title, snippet, rank in rows
+    ]
+
+
+def _highlight(snippet):
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't use FTS5 syntax. No prefix
+    # matching: terms are stemmed, and a prefix of the unstemmed word
+    # ("wedd") need not be a prefix of the stored stem ("wed").
+    return ' '.join(f'"{term}"' for term in _TOKEN.findall(query or ''))
+
+
+def register_searchable(model, kind, title, body, owner=None):
+    """Keep ``model`` rows in the search index.
+
+    ``title`` names the title attribute (or is None) and ``body`` the
+    attributes joined into the searchable body. ``owner(connection, target)``
+    returns the owning user id; by default ``target.user_id``.
+    """
+    fields = ((title,) if title else ()) + tuple(body)
+    owner = owner or (lambda connection, target: target.user_id)
+
+    def index(connection, target):
+        body_text = '\n\n'.join(getattr(target, name) or '' for name in body)
+        title_text = getattr(target, title) if title else None
+        index_document(connection, kind, target.id, owner(connection, target), title_text, body_text)
+
+    @event.listens_for(model, 'after_insert')
+    def index_inserted(mapper, connection, target):
+        index(connection, target)
+
+    @event.listens_for(model, 'after_update')
+    def index_updated(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in fields):
+            index(connection, target)
+
+    @event.listens_for(model, 'after_delete')
+    def remove_deleted(mapper, connection, target):
+        remove_document(connection, kind, target.id)
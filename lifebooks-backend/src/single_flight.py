@@ -0,0 +1,178 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+from sqlalchemy import delete, insert, select, update, and_, or_
+from sqlalchemy.exc import IntegrityError
+from metrics import metrics
+from timestamps import utcnow_naive
+
+
+def flight_key(*parts):
+    """A key for the call described by ``parts`` (JSON-serializable), e.g. user, endpoint and payload"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs identical concurrent calls once and gives every caller the result.
+
+    Within a process, callers of ``do(key, fn)`` that arrive while a call
+    for ``key`` is running wait for it instead of calling ``fn``. With a
+    ``shared`` store (see DatabaseFlights), the first process to claim the
+    key runs the call and the others poll for its published result, for
+    up to ``wait_timeout`` seconds before running ``fn`` themselves.
+
+    Only callers that arrive while the call is running share its outcome;
+    a caller arriving after it finished runs ``fn`` again. ``fn`` should
+    raise on failure rather than return an error: exceptions are passed to
+    the callers waiting in the process but are never published, so other
+    processes, and retries, make the call themselves.
+
+    Results must be JSON-serializable when a shared store is used. Calls
+    saved are counted in metrics as ``single_flight_saved_calls``.
+    """
+
+    def __init__(self, shared=None, wait_timeout=120, poll_interval=0.1):
+        self.shared = shared
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment('single_flight_saved_calls')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn) if self.shared else fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_shared(self, key, fn):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            if self.shared.claim(key):
+                metrics.increment('single_flight_calls')
+                try:
+                    result = fn()
+                except Exception:
+                    self.shared.abandon(key)
+                    raise
+                self.shared.publish(key, result)
+                return result
+            # Another process has the call in flight: wait for its result
+            while time.monotonic() < deadline:
+                found, result = self.shared.result(key)
+                if found:
+                    metrics.increment('single_flight_saved_calls')
+                    return result
+                if not self.shared.in_flight(key):
+                    break  # abandoned or expired; try to claim it
+                time.sleep(self.poll_interval)
+        metrics.increment('single_flight_wait_timeouts')
+        return fn()
+
+
+class DatabaseFlights:
+    """Shared SingleFlight store in a table of ``model``, for every process
+    using the same database.
+
+    ``model`` needs ``key`` (unique), ``result``, ``started_at`` and
+    ``finished_at`` columns. A call is claimed by inserting its key; a
+    claim older than ``lease`` seconds without a result belonged to a
+    process that died and may be claimed again. A finished call may be
+    claimed again at once, so its result only goes to the processes that
+    were already waiting; it is kept up to ``result_ttl`` seconds for them
+    to read. Statements run on their own connection, outside the caller's
+    session.
+    """
+
+    def __init__(self, db, model, lease=120, result_ttl=10):
+        self.db = db
+        self.model = model
+        self.lease = lease
+        self.result_ttl = result_ttl
+
+    def claim(self, key):
+        model = self.model
+        now = utcnow_naive()
+        with self.db.engine.begin() as connection:
+            connection.execute(delete(model).where(model.key == key, self._expired(now)))
+            # A finished call's result was for the callers waiting on it;
+            # a caller arriving now starts a new call
+            reclaimed = connection.execute(
+                update(model)
+                .where(model.key == key, model.finished_at.is_not(None))
+                .values(result=None, started_at=now, finished_at=None)
+            ).rowcount
+        if reclaimed:
+            return True
+        try:
+            with self.db.engine.begin() as connection:
+                connection.execute(insert(model).values(key=key, started_at=now))
+        except IntegrityError:
+            return False
+        return True
+
+    def result(self, key):
+        model = self.model
+        with self.db.engine.connect() as connection:
+            row = connection.execute(
+                select(model.result).where(model.key == key, model.finished_at.is_not(None))
+            ).first()
+        return (True, json.loads(row.result)) if row else (False, None)
+
+    def in_flight(self, key):
+        model = self.model
+        cutoff = utcnow_naive() - datetime.timedelta(seconds=self.lease)
+        with self.db.engine.connect() as connection:
+            return connection.execute(
+                select(model.key).where(model.key == key, or_(model.finished_at.is_not(None), model.started_at >= cutoff))
+            ).first() is not None
+
+    def publish(self, key, result):
+        model = self.model
+        now = utcnow_naive()
+        with self.db.engine.begin() as connection:
+            connection.execute(
+                update(model).where(model.key == key).values(result=json.dumps(result), finished_at=now)
+            )
+            # Results nobody can use any more
+            connection.execute(delete(model).where(self._expired(now)))
+
+    def abandon(self, key):
+        model = self.model
+        with self.db.engine.begin() as connection:
+            connection.execute(delete(model).where(model.key == key, model.finished_at.is_(None)))
+
+    def _expired(self, now):
+        model = self.model
+        return or_(
+            model.finished_at < now - datetime.timedelta(seconds=self.result_ttl),
+            and_(model.finished_at.is_(None), model.started_at < now - datetime.timedelta(seconds=self.lease))
+        )
@@ -0,0 +1,63 @@
+import hashlib
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply to its base text"""
+
+
+def content_hash(text):
+    """Stable hash of a text body, used to detect no-op saves"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def is_valid_text(text):
+    """Whether ``text`` is a string that can be stored: no unpaired surrogates"""
+    if not isinstance(text, str):
+        return False
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def apply_patch(base, operations):
+    """Apply a list of splice operations to ``base`` and return the new text.
+
+    Each operation is ``{"start": int, "end": int, "text": str}`` and replaces
+    the base text from ``start`` to ``end`` with ``text``. Offsets count
+    UTF-16 code units, as JavaScript string indices do, into the base text
+    (not the partially patched one); operations must be sorted and
+    non-overlapping, and may not split a surrogate pair.
+    """
+    if not isinstance(operations, list):
+        raise PatchError("Patch must be a list of operations")
+
+    units = base.encode('utf-16-le')
+    length = len(units) // 2
+    pieces = []
+    position = 0
+    for operation in operations:
+        try:
+            start, end, text = operation['start'], operation['end'], operation.get('text', '')
+        except (TypeError, KeyError):
+            raise PatchError("Each operation needs start, end and text")
+        if not (isinstance(start, int) and isinstance(end, int) and isinstance(text, str)):
+            raise PatchError("start and end must be integers and text a string")
+        if not is_valid_text(text):
+            raise PatchError("text contains an unpaired surrogate")
+        if start < position or end < start or end > length:
+            raise PatchError(f"Operation {start}:{end} is out of order or out of range")
+        for offset in (start, end):
+            if _splits_pair(units, offset, length):
+                raise PatchError(f"Offset {offset} splits a character")
+        pieces.append(units[position * 2:start * 2].decode('utf-16-le'))
+        pieces.append(text)
+        position = end
+    pieces.append(units[position * 2:].decode('utf-16-le'))
+    return ''.join(pieces)
+
+
+def _splits_pair(units, offset, length):
+    # A low surrogate at the offset means it falls inside a surrogate pair
+    return 0 < offset < length and 0xDC <= units[offset * 2 + 1] <= 0xDF
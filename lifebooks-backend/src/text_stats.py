@@ -0,0 +1,144 @@
+import bisect
+import json
+import re
+
+WORDS_PER_MINUTE = 200  # reading speed for reading-time estimates
+WORDS_PER_PAGE = 250  # typeset book page, for length estimates
+
+# Lines that start a chapter: markdown headings or "Chapter ..." lines
+_HEADING = re.compile(r'^[ \t]*(?:#{1,6}[ \t]+\S.*|chapter\b.*)$', re.IGNORECASE | re.MULTILINE)
+
+# Block size used when scanning for the changed span of two texts
+_SCAN_BLOCK = 4096
+
+
+def reading_minutes(word_count):
+    return round((word_count or 0) / WORDS_PER_MINUTE, 1)
+
+
+def estimated_pages(word_count):
+    return -(-(word_count or 0) // WORDS_PER_PAGE)
+
+
+def changed_span(old, new):
+    """Return ``(start, end, replacement)`` such that replacing
+    ``old[start:end]`` with ``replacement`` turns ``old`` into ``new``.
+
+    Common prefix and suffix are found block by block, so only the area
+    around the edit is compared character by character.
+    """
+    limit = min(len(old), len(new))
+    prefix = _common_length(old, new, limit, forward=True)
+    suffix = _common_length(old, new, limit - prefix, forward=False)
+    return prefix, len(old) - suffix, new[prefix:len(new) - suffix]
+
+
+def _common_length(old, new, limit, forward):
+    matched = 0
+    while matched < limit:
+        size = min(_SCAN_BLOCK, limit - matched)
+        if forward:
+            a, b = old[matched:matched + size], new[matched:matched + size]
+        else:
+            a = old[len(old) - matched - size:len(old) - matched]
+            b = new[len(new) - matched - size:len(new) - matched]
+        if a == b:
+            matched += size
+            continue
+        if not forward:
+            a, b = a[::-1], b[::-1]
+        for i in range(size):
+            if a[i] != b[i]:
+                return matched + i
+    return matched
+
+
+class TextStats:
+    """Word and character counts of a text, overall and per chapter.
+
+    Stats are kept up to date from edits: ``apply_edit`` recounts only the
+    words around the changed span and moves the chapter offsets after it,
+    falling back to a full scan only when a chapter heading is touched.
+    """
+
+    def __init__(self, chapters):
+        # [offset, title, words, characters] per chapter; text before the
+        # first heading is a chapter with title None
+        self.chapters = chapters
+
+    @classmethod
+    def from_text(cls, text):
+        text = text or ''
+        starts = [0] + [match.start() for match in _HEADING.finditer(text) if match.start() > 0]
+        chapters = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else len(text)
+            body = text[start:end]
+            heading = _HEADING.match(body)
+            title = heading.group().strip().lstrip('#').strip() if heading else None
+            chapters.append([start, title, len(body.split()), end - start])
+        return cls(chapters)
+
+    @classmethod
+    def from_json(cls, value):
+        return cls(json.loads(value)) if value else None
+
+    def to_json(self):
+        return json.dumps(self.chapters)
+
+    @property
+    def words(self):
+        return sum(chapter[2] for chapter in self.chapters)
+
+    @property
+    def characters(self):
+        return sum(chapter[3] for chapter in self.chapters)
+
+    def chapter_list(self):
+        return [
+            {'title': title, 'word_count': words, 'character_count': characters}
+            for _offset, title, words, characters in self.chapters
+        ]
+
+    def apply_edit(self, old_text, start, end, replacement):
+        """Update the stats for ``old_text[start:end]`` replaced by ``replacement``.
+
+        Returns the updated stats (a new object after a full rescan).
+        """
+        old_text = old_text or ''
+        line_start = old_text.rfind('\n', 0, start) + 1
+        line_end = old_text.find('\n', end)
+        line_end = len(old_text) if line_end == -1 else line_end
+        new_lines = old_text[line_start:start] + replacement + old_text[end:line_end]
+        if _HEADING.search(old_text, line_start, line_end) or _HEADING.search(new_lines):
+            new_text = old_text[:start] + replacement + old_text[end:]
+            return TextStats.from_text(new_text)
+
+        # Widen to whole words so words split or joined by the edit count right
+        word_start = start
+        while word_start > 0 and not old_text[word_start - 1].isspace():
+            word_start -= 1
+        word_end = end
+        while word_end < len(old_text) and not old_text[word_end].isspace():
+            word_end += 1
+        old_words = len(old_text[word_start:word_end].split())
+        new_words = len((old_text[word_start:start] + replacement + old_text[end:word_end]).split())
+
+        offsets = [chapter[0] for chapter in self.chapters]
+        index = max(bisect.bisect_right(offsets, start) - 1, 0)
+        shift = len(replacement) - (end - start)
+        chapter = self.chapters[index]
+        chapter[2] += new_words - old_words
+        chapter[3] += shift
+        for following in self.chapters[index + 1:]:
+            following[0] += shift
+        return self
+
+
+def update_stats(stats, old_text, new_text):
+    """Stats for ``new_text`` given the stats of ``old_text`` (None forces a full scan)"""
+    if stats is None or old_text is None:
+        return TextStats.from_text(new_text)
+    if old_text == new_text:
+        return stats
+    return stats.apply_edit(old_text, *changed_span(old_text, new_text))
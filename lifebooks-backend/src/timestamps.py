@@ -0,0 +1,10 @@
+import datetime
+
+
+def utcnow_naive():
+    """The current time in naive UTC.
+
+    DateTime columns are stored without tzinfo, so this compares with
+    stored timestamps on every backend.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,49 @@
+import time
+
+from memory_cache import LRUCache
+
+
+class TokenCache(LRUCache):
+    """Bounded LRU cache of verified auth tokens with a per-entry TTL.
+
+    Entries map a bearer token to a small snapshot of the user it resolved to.
+    The cache is per process and ``invalidate_user`` only reaches this
+    process: other processes keep their entries for up to ``ttl`` seconds.
+    Snapshot only what cannot change for a token (the user id), and read
+    mutable columns such as plan or status from the database.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self._tokens_by_user = {}
+
+    def get(self, token):
+        """Return the cached snapshot for a token, or None on miss/expiry"""
+        entry = super().get(token)
+        return None if entry is None else entry[1]
+
+    def set(self, token, user_id, snapshot, expires_at=None):
+        """Cache a snapshot; ``expires_at`` is a unix timestamp (e.g. JWT exp)"""
+        ttl = None if expires_at is None else expires_at - time.time()
+        super().set(token, (user_id, snapshot), ttl=ttl)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token that resolved to ``user_id``"""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _added(self, token, entry):
+        self._tokens_by_user.setdefault(entry[0], set()).add(token)
+
+    def _removed(self, token, entry):
+        tokens = self._tokens_by_user.get(entry[0])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0]]
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+import wave
+import openai
+from audio_segments import split_wav, write_segment, needs_normalizing
+
+
+class WhisperTranscriber:
+    model = 'whisper-1'
+
+    def transcribe(self, audio_file):
+        # The OpenAI client sends audio_file.name, whose extension tells
+        # Whisper the format
+        return openai.Audio.transcribe(model=self.model, file=audio_file, response_format="text")
+
+
+class FakeTranscriber:
+    """Offline stand-in for Whisper, for tests and benchmarks.
+
+    Describes the audio it was given instead of transcribing it, after
+    sleeping ``seconds_per_audio_second`` for every second of audio and,
+    to stand in for the upload, a second per ``upload_bytes_per_second``
+    bytes of file.
+    """
+
+    model = 'fake'
+
+    def __init__(self, seconds_per_audio_second=0.0, upload_bytes_per_second=None):
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.upload_bytes_per_second = upload_bytes_per_second
+
+    def transcribe(self, audio_file):
+        if self.upload_bytes_per_second:
+            time.sleep(os.fstat(audio_file.fileno()).st_size / self.upload_bytes_per_second)
+        try:
+            with wave.open(audio_file, 'rb') as audio:
+                duration = audio.getnframes() / audio.getframerate()
+        except (wave.Error, EOFError):
+            duration = 0.0
+        time.sleep(duration * self.seconds_per_audio_second)
+        return f"[{duration:.2f}s of audio from {os.path.basename(audio_file.name)}]"
+
+
+TRANSCRIBERS = {'whisper': WhisperTranscriber, 'fake': FakeTranscriber}
+
+
+def transcribe_file(path, transcriber, executor, segment_seconds=300, sample_rate=None):
+    """Transcribe the recording at ``path``.
+
+    WAV recordings longer than ``segment_seconds`` are cut at pauses (see
+    audio_segments.split_wav) and the segments transcribed concurrently on
+    ``executor``; the texts are joined in recording order. With
+    ``sample_rate``, WAV audio is sent as 16-bit mono at that rate (see
+    audio_segments.write_segment). Other formats are already compressed
+    and are sent whole, as they are.
+
+    Returns ``(transcript, segments, duration)``: segments are dicts with
+    start and end (seconds, end None if unknown) and text; duration is
+    None for formats that can't be measured.
+    """
+    split = split_wav(path, segment_seconds)
+    normalize = bool(split and sample_rate and needs_normalizing(path, sample_rate))
+    if split is None or (len(split[1]) == 1 and not normalize):
+        with open(path, 'rb') as audio:
+            text = transcriber.transcribe(audio).strip()
+        duration = split[1][0][1] / split[0] if split else None
+        return text, [{'start': 0.0, 'end': duration, 'text': text}], duration
+
+    rate, cuts = split
+
+    def transcribe_segment(cut):
+        with tempfile.NamedTemporaryFile(suffix='.wav') as segment_file:
+            write_segment(path, cut[0], cut[1], segment_file, sample_rate=sample_rate if normalize else None)
+            segment_file.seek(0)
+            return transcriber.transcribe(segment_file).strip()
+
+    # map() yields results in submission order, whichever finishes first
+    texts = list(executor.map(transcribe_segment, cuts))
+    segments = [
+        {'start': round(start / rate, 2), 'end': round(end / rate, 2), 'text': text}
+        for (start, end), text in zip(cuts, texts)
+    ]
+    return ' '.join(text for text in texts if text), segments, cuts[-1][1] / rate
@@ -0,0 +1,95 @@
+import hashlib
+import tempfile
+from flask import Request, current_app
+from werkzeug.utils import secure_filename
+from metrics import metrics
+
+
+class SpooledUpload(tempfile.SpooledTemporaryFile):
+    """Buffer for one uploaded file: in memory up to ``max_size`` bytes,
+    then moved to an anonymous temporary file that disappears on close.
+
+    ``name`` is the uploaded file name, since upload clients (the OpenAI
+    client among them) take the file name they send from the file object.
+    The content is hashed as it is written; see ``content_hash``.
+
+    ``inspect(head)``, if given, is called with the first ``inspect_size``
+    bytes as soon as they have arrived; an exception it raises aborts the
+    upload before the rest of the body is read.
+    """
+
+    def __init__(self, max_size, filename=None, inspect=None, inspect_size=64 * 1024):
+        super().__init__(max_size=max_size, mode='w+b')
+        self.filename = secure_filename(filename or '') or 'upload'
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._inspect = inspect
+        self._inspect_size = inspect_size
+        self._head = b''
+        self._open = True
+        metrics.increment('uploads_started')
+        metrics.increment('uploads_in_progress')
+
+    @property
+    def name(self):
+        return self.filename
+
+    def write(self, data):
+        if self._inspect:
+            self._check_head(data)
+        written = super().write(data)
+        self.size += written
+        self._hash.update(data[:written])
+        return written
+
+    def _check_head(self, data):
+        self._head += data[:self._inspect_size - len(self._head)]
+        if len(self._head) >= self._inspect_size:
+            self._run_inspect()
+
+    def _run_inspect(self):
+        inspect, self._inspect = self._inspect, None
+        head, self._head = self._head, b''
+        try:
+            inspect(head)
+        except Exception:
+            self.close()
+            raise
+
+    def content_hash(self):
+        # sha256 of everything written so far
+        return self._hash.hexdigest()
+
+    def rollover(self):
+        if not self._rolled:
+            metrics.increment('uploads_spooled_to_disk')
+        super().rollover()
+
+    def close(self):
+        if self._open:
+            self._open = False
+            metrics.increment('uploads_in_progress', -1)
+            metrics.increment('upload_bytes', self.size)
+            metrics.set_max('upload_largest_bytes', self.size)
+        super().close()
+
+
+class UploadRequest(Request):
+    """Request whose file uploads are written, once, into a SpooledUpload
+    as the form is parsed. ``UPLOAD_SPOOL_SIZE`` bounds the memory each
+    upload may use; ``MAX_CONTENT_LENGTH`` is checked while the body is read.
+
+    Subclasses can override ``inspect_upload`` to reject a file from its
+    first ``UPLOAD_INSPECT_SIZE`` bytes.
+    """
+
+    def inspect_upload(self, filename, head):
+        pass
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledUpload(
+            current_app.config['UPLOAD_SPOOL_SIZE'],
+            filename,
+            inspect=lambda head: self.inspect_upload(filename, head),
+            inspect_size=current_app.config['UPLOAD_INSPECT_SIZE']
+        )
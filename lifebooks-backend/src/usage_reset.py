@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import select, update, or_
+
+UsageResetResult = namedtuple('UsageResetResult', ['rows', 'seconds'])
+
+
+def reset_due_usage(session, model, counter_columns, reset_column, cutoff, reset_to, chunk_size=1000):
+    """Zero the usage counters of every row whose window started at or before ``cutoff``.
+
+    Rows are reset with set-based UPDATEs in chunks of ``chunk_size`` ids,
+    picked through the index on ``reset_column``, committing after each chunk
+    so the table is never locked for long. Reset rows get ``reset_to`` as their
+    new window start and drop out of the next chunk's selection.
+    """
+    started = time.perf_counter()
+    due = or_(reset_column.is_(None), reset_column <= cutoff)
+    values = {column: 0 for column in counter_columns}
+    values[reset_column] = reset_to
+    rows = 0
+
+    while True:
+        ids = session.execute(
+            select(model.id).where(due).order_by(reset_column).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        result = session.execute(
+            update(model)
+            .where(model.id.in_(ids), due)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        rows += result.rowcount
+
+    return UsageResetResult(rows=rows, seconds=time.perf_counter() - started)
+
+
+def start_usage_reset_scheduler(app, job, interval):
+    """Run ``job`` inside an app context every ``interval`` seconds on a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                with app.app_context():
+                    result = job()
+                print(f"Usage reset: {result.rows} users in {result.seconds:.3f}s")
+            except Exception as e:
+                print(f"Usage reset error: {str(e)}")
+
+    threading.Thread(target=run, name='usage-reset', daemon=True).start()
+    return stop
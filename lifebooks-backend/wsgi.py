@@ -1,4 +1,10 @@
-from src.main import app
+import os
+import sys
+
+# main.py imports its sibling modules (token_cache, ...) as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from main import app
 
 if __name__ == "__main__":
     app.run()
@@ -197,8 +197,25 @@ const StoryCreator = () => {
       
       if (response.ok) {
         const data = await response.json();
-        const transcribedText = data.transcription || data.text;
-        if (transcribedText) {
+        // Transcription runs as a background job; poll until it finishes,
+        // backing off so long recordings don't cost a request a second
+        let recording = data.recording;
+        let delay = 1000;
+        while (recording && !['completed', 'failed'].includes(recording.processing_status)) {
+          await new Promise(resolve => setTimeout(resolve, delay));
+          delay = Math.min(delay * 2, 10000);
+          const statusResponse = await fetch(`${API_BASE_URL}${data.status_url}?wait=0`, {
+            headers: {
+              'Authorization': `Bearer demo-token`
+            }
+          });
+          if (!statusResponse.ok) break;
+          recording = (await statusResponse.json()).recording;
+        }
+        const transcribedText = recording ? recording.transcript : (data.transcription || data.text);
+        if (recording && recording.processing_status !== 'completed') {
+          setTranscription('Voice recording completed. Please type your response below or try recording again.');
+        } else if (transcribedText) {
           setTranscription(transcribedText);
           setCurrentAnswer(prev => prev + ' ' + transcribedText);
         } else {